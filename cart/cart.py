@@ -4,16 +4,39 @@ from coupons.models import Coupon
 from django.conf import settings
 from django.utils import translation
 from shop.models import Product
+from shop.money import Money, get_currency, parse_amount
+from shop.shipping import get_shipping_cost
+
+from .storage import get_cart_storage
+
+
+def get_cart_products(request, product_ids):
+    """
+    Возвращает товары корзины из снимка, общего для всего запроса.
+    Товары вместе с переводами и весом загружаются один раз, а все
+    экземпляры Cart (view, контекстный процессор) используют их повторно.
+    """
+    snapshot = getattr(request, "_cart_products", None)
+    if snapshot is None:
+        snapshot = request._cart_products = {}
+    missing_ids = [int(id) for id in product_ids if int(id) not in snapshot]
+    if missing_ids:
+        products = Product.objects.filter(id__in=missing_ids).prefetch_related(
+            "translations"
+        )
+        for product in products:
+            snapshot[product.id] = product
+    return snapshot
 
 
 class Cart:
     def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
-        self.coupon_id = self.session.get("coupon_id")
+        self.request = request
+        self.storage = get_cart_storage(request)
+        self.cart = self.storage.items
+        self.coupon_id = self.storage.coupon_id
+        # Позиции с товарами и суммами, собираются один раз
+        self._lines = None
 
     def get_currency_info(self):
         """Возвращает информацию о валюте для текущего языка"""
@@ -22,10 +45,9 @@ class Cart:
     
     def convert_price(self, price):
         """Конвертирует цену из РУБЛЕЙ в текущую валюту"""
-        currency_info = self.get_currency_info()
-        
-        # Базовая цена в РУБЛЯХ, конвертируем в целевую валюту
-        return round(Decimal(str(price)) * Decimal(str(currency_info['rate'])), 2)
+        if not isinstance(price, Money):
+            price = Money.from_decimal(price)
+        return price.convert(get_currency())
 
     def add(self, product, quantity=1, override_quantity=False):
         product_id = str(product.id)
@@ -39,44 +61,55 @@ class Cart:
             self.cart[product_id]["quantity"] = quantity
         else:
             self.cart[product_id]["quantity"] += quantity
-        self.save()
-
-    def save(self):
-        self.session.modified = True
+        self._lines = None
+        self.storage.save_item(product_id)
 
     def remove(self, product):
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
-            self.save()
+            self._lines = None
+            self.storage.remove_item(product_id)
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-
-        for product in products:
-            cart[str(product.id)]["product"] = product
-
-        for item in cart.values():
-            # Храним оригинальную цену, конвертация будет в шаблоне через фильтр
-            original_price = Decimal(item["price"])
-            item["price"] = original_price  # Оставляем оригинальную цену
-            item["total_price"] = item["price"] * item["quantity"]
-            yield item
+        if self._lines is None:
+            products = get_cart_products(self.request, self.cart.keys())
+            self._lines = []
+            for product_id, item in self.cart.items():
+                # Цена хранится в рублях, конвертация будет в шаблоне через фильтр
+                price = Money.parse(item["price"])
+                line = {
+                    "quantity": item["quantity"],
+                    "price": price,
+                    "total_price": price * item["quantity"],
+                }
+                product = products.get(int(product_id))
+                if product is not None:
+                    line["product"] = product
+                self._lines.append(line)
+        return iter(self._lines)
 
     def __len__(self):
         return sum(item["quantity"] for item in self.cart.values())
 
     def get_total_price(self):
         """Общая цена в оригинальной валюте (рублях)"""
-        return sum(
-            Decimal(item["price"]) * item["quantity"] for item in self.cart.values()
+        # Суммируются целые копейки, Money создается один раз
+        return Money(
+            sum(
+                parse_amount(item["price"]) * item["quantity"]
+                for item in self.cart.values()
+            )
         )
 
     def clear(self):
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.storage.clear()
+        self.cart = self.storage.items
+        self._lines = None
+
+    def set_coupon(self, coupon_id):
+        self.storage.set_coupon(coupon_id)
+        self.coupon_id = coupon_id
 
     @property
     def coupon(self):
@@ -88,60 +121,40 @@ class Cart:
         return None
 
     def get_discount(self):
-        if self.coupon:
-            # Скидка рассчитывается от оригинальной цены
-            original_total = self.get_total_price()
-            discount_amount = (self.coupon.discount / Decimal(100)) * original_total
-            return discount_amount  # Возвращаем в оригинальной валюте
-        return Decimal(0)
+        coupon = self.coupon
+        if coupon:
+            # Скидка рассчитывается от оригинальной цены в рублях
+            return self.get_total_price().percent(coupon.discount)
+        return Money(0)
 
     def get_total_price_after_discount(self):
         return self.get_total_price() - self.get_discount()
     
     def format_price(self, price):
-        """Форматирует цену для отображения"""
-        currency_info = self.get_currency_info()
-        if currency_info['code'] == 'RUB':
-            return f"{price:,.2f} {currency_info['symbol']}".replace(',', ' ').replace('.', ',')
-        elif currency_info['code'] == 'EUR':
-            return f"{currency_info['symbol']}{price:,.2f}"
-        else:  # USD
-            return f"{currency_info['symbol']}{price:,.2f}"
-    
+        """Форматирует цену (уже в текущей валюте) для отображения"""
+        if not isinstance(price, Money):
+            price = Money.from_decimal(price, get_currency().code)
+        return price.format()
+
     def get_stripe_total(self):
         """Возвращает сумму для Stripe (в центах/копейках)"""
-        currency_info = self.get_currency_info()
-        # Конвертируем общую сумму в целевую валюту для Stripe
-        total_rub = self.get_total_price_after_discount()
-        total_converted = self.convert_price(total_rub)
-        
-        if currency_info['code'] in ['USD', 'EUR', 'RUB']:
-            return int(total_converted * 100)  # центы/копейки
-        return int(total_converted * 100)
-    
+        return self.convert_price(self.get_total_price_after_discount()).amount
+
     def get_stripe_currency(self):
         """Возвращает валюту для Stripe"""
-        return self.get_currency_info()['stripe_currency']
-    
+        return get_currency().stripe_currency
+
     def get_total_weight(self):
         """Возвращает общий вес корзины в граммах"""
+        # Вес берется из снимка товаров запроса, без сборки позиций корзины
+        products = get_cart_products(self.request, self.cart.keys())
         total_weight = Decimal('0')
-        for item in self:
-            product = item['product']
-            quantity = item['quantity']
-            total_weight += product.weight * quantity
+        for product_id, item in self.cart.items():
+            product = products.get(int(product_id))
+            if product is not None:
+                total_weight += product.weight * item['quantity']
         return total_weight
 
     def calculate_shipping_cost_base(self):
         """Рассчитывает стоимость доставки в базовой валюте (рублях)"""
-        total_weight = self.get_total_weight()
-        
-        # Тарифы доставки в РУБЛЯХ
-        if total_weight <= 1000:  # до 1 кг
-            return Decimal('500.00')
-        elif total_weight <= 5000:  # до 5 кг
-            return Decimal('800.00')
-        elif total_weight <= 10000:  # до 10 кг
-            return Decimal('1200.00')
-        else:  # свыше 10 кг
-            return Decimal('1200.00') + (total_weight - 10000) / 1000 * Decimal('100.00')
\ No newline at end of file
+        return get_shipping_cost(self.get_total_weight())
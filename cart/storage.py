@@ -0,0 +1,200 @@
+"""
+Хранилища содержимого корзины.
+
+SessionCartStorage хранит корзину в сессии, как раньше: при каждом
+изменении сессия сохраняется целиком. RedisCartStorage хранит корзину в
+хэше Redis cart:<id> (поле на товар) со сроком жизни CART_TTL, а в сессию
+один раз записывается только id корзины. Если Redis недоступен для
+записи, корзина сохраняется в сессии вместе с id хэша и переносится в
+Redis, когда он снова доступен. Хранилище выбирается настройкой CART_STORAGE.
+"""
+import json
+import logging
+import uuid
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+from shop.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def get_cart_storage(request):
+    """Хранилище корзины, общее для всех экземпляров Cart в запросе"""
+    storage = getattr(request, "_cart_storage", None)
+    if storage is None:
+        storage = request._cart_storage = import_string(settings.CART_STORAGE)(
+            request
+        )
+    return storage
+
+
+class SessionCartStorage:
+    def __init__(self, request):
+        self.session = request.session
+        items = self.session.get(settings.CART_SESSION_ID)
+        if not items:
+            items = self.session[settings.CART_SESSION_ID] = {}
+        self.items = items
+        self.coupon_id = self.session.get("coupon_id")
+
+    def save_item(self, product_id):
+        self.session.modified = True
+
+    def remove_item(self, product_id):
+        self.session.modified = True
+
+    def set_coupon(self, coupon_id):
+        self.coupon_id = self.session["coupon_id"] = coupon_id
+
+    def clear(self):
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.items = {}
+
+
+class RedisCartStorage:
+    COUPON_FIELD = "coupon"
+    # id хэша корзины, пока она хранится в сессии из-за недоступности Redis
+    FALLBACK_SESSION_KEY = "cart_fallback"
+
+    def __init__(self, request):
+        self.session = request.session
+        self.client = get_redis()
+        self.items = {}
+        self.coupon_id = None
+        # Redis недоступен для записи - корзина до конца запроса в сессии
+        self.in_session = False
+        # содержимое хэша прочитано: self.items - вся корзина
+        self.loaded = True
+        value = self.session.get(settings.CART_SESSION_ID)
+        fallback = self.session.get(self.FALLBACK_SESSION_KEY)
+        self.cart_id = value if isinstance(value, str) else None
+        if self.cart_id:
+            self._load()
+        elif value or self.session.get("coupon_id") or fallback:
+            # корзина и купон, сохраненные в сессии до перехода на Redis
+            # (или пока Redis был недоступен)
+            self.items = value or {}
+            self.coupon_id = self.session.get("coupon_id")
+            self._move_to_redis(fallback)
+
+    @property
+    def key(self):
+        return f"cart:{self.cart_id}"
+
+    def _parse(self, fields):
+        items = {}
+        coupon_id = None
+        for field, value in fields.items():
+            field = field.decode()
+            if field == self.COUPON_FIELD:
+                coupon_id = int(value)
+            else:
+                items[field] = json.loads(value)
+        return items, coupon_id
+
+    def _dump(self, item):
+        return json.dumps({"quantity": item["quantity"], "price": str(item["price"])})
+
+    def _load(self):
+        try:
+            fields = self.client.hgetall(self.key)
+        except redis.RedisError:
+            # без корзины в шапке страница продолжает работать
+            logger.warning("Корзина %s недоступна", self.cart_id, exc_info=True)
+            self.loaded = False
+            return
+        self.items, self.coupon_id = self._parse(fields)
+
+    def _move_to_redis(self, fallback):
+        """Переносит корзину из сессии в хэш одним MULTI/EXEC"""
+        if fallback:
+            # хэш, которым корзина пользовалась до сбоя, сохраняется
+            self.cart_id = fallback["cart_id"]
+            self.loaded = not fallback["merge"]
+        if not self.loaded:
+            # хэш не был прочитан: в сессии только изменения, сделанные без
+            # Redis, они дополняют сохраненную корзину
+            try:
+                fields = self.client.hgetall(self.key)
+            except redis.RedisError:
+                logger.warning("Корзина %s недоступна", self.cart_id, exc_info=True)
+                self.in_session = True
+                return
+            items, coupon_id = self._parse(fields)
+            self.items = {**items, **self.items}
+            self.coupon_id = self.coupon_id or coupon_id
+            self.loaded = True
+
+        mapping = {
+            product_id: self._dump(item) for product_id, item in self.items.items()
+        }
+        if self.coupon_id:
+            mapping[self.COUPON_FIELD] = self.coupon_id
+
+        def replace(pipe):
+            pipe.delete(self.key)
+            if mapping:
+                pipe.hset(self.key, mapping=mapping)
+
+        self._write(replace)
+        if not self.in_session:
+            self.session[settings.CART_SESSION_ID] = self.cart_id
+            self.session.pop(self.FALLBACK_SESSION_KEY, None)
+            self.session.pop("coupon_id", None)
+
+    def _store_in_session(self):
+        # как в SessionCartStorage; при следующем запросе с доступным Redis
+        # корзина будет перенесена обратно
+        self.session[settings.CART_SESSION_ID] = self.items
+        self.session["coupon_id"] = self.coupon_id
+
+    def _write(self, fill):
+        """Выполняет команды fill(pipe) и продлевает срок жизни корзины"""
+        if self.in_session:
+            self._store_in_session()
+            return
+        if not self.cart_id:
+            self.cart_id = uuid.uuid4().hex
+            self.session[settings.CART_SESSION_ID] = self.cart_id
+        try:
+            with self.client.pipeline(transaction=True) as pipe:
+                fill(pipe)
+                pipe.expire(self.key, settings.CART_TTL)
+                pipe.execute()
+        except redis.RedisError:
+            logger.warning(
+                "Корзина %s сохранена в сессии: Redis недоступен",
+                self.cart_id,
+                exc_info=True,
+            )
+            self.in_session = True
+            self.session[self.FALLBACK_SESSION_KEY] = {
+                "cart_id": self.cart_id,
+                "merge": not self.loaded,
+            }
+            self._store_in_session()
+
+    def save_item(self, product_id):
+        value = self._dump(self.items[product_id])
+        self._write(lambda pipe: pipe.hset(self.key, product_id, value))
+
+    def remove_item(self, product_id):
+        if self.cart_id or self.in_session:
+            self._write(lambda pipe: pipe.hdel(self.key, product_id))
+
+    def set_coupon(self, coupon_id):
+        self.coupon_id = coupon_id
+        if coupon_id is None:
+            self.remove_item(self.COUPON_FIELD)
+        else:
+            self._write(lambda pipe: pipe.hset(self.key, self.COUPON_FIELD, coupon_id))
+
+    def clear(self):
+        # купон, как и в сессии, остается применен
+        items, self.items = self.items, {}
+        if self.in_session:
+            self._store_in_session()
+        elif self.cart_id and items:
+            self._write(lambda pipe: pipe.hdel(self.key, *items))
@@ -1,3 +1,212 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import redis
+from coupons.models import Coupon
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+from shop.models import Category, Product
+from shop.money import Money
+from shop.testing import REDIS_TEST_DB, redis_available, setUpModule  # noqa: F401
+
+from .storage import RedisCartStorage, get_redis
+
+SESSION_STORAGE = "cart.storage.SessionCartStorage"
+REDIS_STORAGE = "cart.storage.RedisCartStorage"
+IN_PROCESS_BACKEND = "shop.recommender_backends.InProcessBackend"
+
+
+@override_settings(CART_STORAGE=SESSION_STORAGE, RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class CartStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Ужи", slug="uzhi")
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Уж {i}",
+                slug=f"uzh-{i}",
+                price=Decimal("300.00"),
+            )
+            for i in range(2)
+        ]
+        now = timezone.now()
+        cls.coupon = Coupon.objects.create(
+            code="SNAKE10",
+            valid_form=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1),
+            discount=10,
+            active=True,
+        )
+
+    def setUp(self):
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+
+    def add(self, product, quantity, override=False):
+        data = {"quantity": quantity}
+        if override:
+            data["override"] = "on"
+        return self.client.post(reverse("cart:cart_add", args=[product.id]), data)
+
+    def get_cart(self):
+        return self.client.get(reverse("cart:cart_detail")).context["cart"]
+
+    def test_add_update_remove_and_coupon(self):
+        first, second = self.products
+        self.add(first, 2)
+        self.add(first, 1)
+        self.add(second, 5)
+        self.add(second, 1, override=True)
+        cart = self.get_cart()
+        self.assertEqual(len(cart), 4)
+        self.assertEqual(cart.get_total_price(), Money(120000))
+
+        self.client.post(reverse("coupons:apply"), {"code": "snake10"})
+        cart = self.get_cart()
+        self.assertEqual(cart.get_discount(), Money(12000))
+
+        self.client.post(reverse("cart:cart_remove", args=[first.id]))
+        cart = self.get_cart()
+        self.assertEqual(len(cart), 1)
+        self.assertEqual(cart.coupon, self.coupon)
+
+    def test_json_api_returns_changed_totals(self):
+        first, second = self.products
+        response = self.client.post(
+            reverse("cart:api_add", args=[first.id]), {"quantity": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["items"], 2)
+        self.assertEqual(data["currency"], "RUB")
+        self.assertEqual(data["subtotal"], "600,00 ₽")
+        self.assertEqual(data["item"]["quantity"], 2)
+
+        self.client.post(reverse("cart:api_add", args=[second.id]), {"quantity": 1})
+        data = self.client.post(
+            reverse("cart:api_update", args=[second.id]), {"quantity": 4}
+        ).json()
+        self.assertEqual(data["items"], 6)
+        self.assertEqual(data["item"]["total_price"], "1 200,00 ₽")
+
+        data = self.client.post(reverse("cart:api_coupon"), {"code": "SNAKE10"}).json()
+        self.assertEqual(data["coupon"], {"code": "SNAKE10", "discount": 10})
+        self.assertEqual(data["discount"], "180,00 ₽")
+        self.assertEqual(data["shipping"], "500,00 ₽")
+        self.assertEqual(data["total"], "2 120,00 ₽")
+
+        data = self.client.post(reverse("cart:api_remove", args=[first.id])).json()
+        self.assertIsNone(data["item"])
+        self.assertEqual(data["items"], 4)
+        summary = self.client.get(reverse("cart:api_summary")).json()
+        del data["item"]
+        self.assertEqual(summary, data)
+
+        response = self.client.post(
+            reverse("cart:api_update", args=[second.id]), {"quantity": 0}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.json()["errors"])
+
+    def test_stripe_total_in_minor_units(self):
+        self.add(self.products[0], 3)
+        self.client.post(reverse("coupons:apply"), {"code": "SNAKE10"})
+        with translation.override("en"):
+            cart = self.get_cart()
+            # 900 ₽ - 10% = 810 ₽ = 9.72 $
+            self.assertEqual(cart.get_stripe_total(), 972)
+            self.assertEqual(cart.get_stripe_currency(), "usd")
+
+    def test_payment_completed_clears_cart(self):
+        self.add(self.products[0], 3)
+        self.client.get(reverse("payment:completed"))
+        self.assertEqual(len(self.get_cart()), 0)
+
+
+@skipUnless(redis_available(), "Redis недоступен")
+@override_settings(CART_STORAGE=REDIS_STORAGE, REDIS_DB=REDIS_TEST_DB)
+class RedisCartStorageTests(CartStorageTests):
+    def setUp(self):
+        super().setUp()
+        # база REDIS_TEST_DB только для тестов, в том числе брошенные
+        # при переносе корзины хэши
+        self.addCleanup(get_redis().flushdb)
+
+    def test_cart_is_stored_in_redis_hash(self):
+        first, second = self.products
+        self.add(first, 2)
+        cart_id = self.client.session[settings.CART_SESSION_ID]
+        self.add(second, 1)
+        # в сессии хранится только id корзины, он не меняется
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID], cart_id)
+
+        key = f"cart:{cart_id}"
+        self.assertEqual(
+            set(get_redis().hkeys(key)),
+            {str(first.id).encode(), str(second.id).encode()},
+        )
+        self.assertLessEqual(get_redis().ttl(key), settings.CART_TTL)
+        self.assertGreater(get_redis().ttl(key), 0)
+
+    def test_session_cart_is_moved_to_redis(self):
+        first = self.products[0]
+        with override_settings(CART_STORAGE=SESSION_STORAGE):
+            self.add(first, 2)
+            self.client.post(reverse("coupons:apply"), {"code": "SNAKE10"})
+        self.assertIsInstance(self.client.session[settings.CART_SESSION_ID], dict)
+
+        self.add(first, 1)
+        self.assertIsInstance(self.client.session[settings.CART_SESSION_ID], str)
+        cart = self.get_cart()
+        self.assertEqual(len(cart), 3)
+        # примененный купон переносится вместе с корзиной
+        self.assertEqual(cart.coupon, self.coupon)
+        self.assertNotIn("coupon_id", self.client.session)
+
+    def test_cart_falls_back_to_session_while_redis_is_down(self):
+        first, second = self.products
+        self.add(first, 2)
+        self.client.post(reverse("coupons:apply"), {"code": "SNAKE10"})
+        cart_id = self.client.session[settings.CART_SESSION_ID]
+        with override_settings(REDIS_PORT=1):
+            with self.assertLogs("cart.storage", "WARNING"):
+                response = self.add(second, 1)
+            self.assertEqual(response.status_code, 302)
+            session_cart = self.client.session[settings.CART_SESSION_ID]
+            self.assertIsInstance(session_cart, dict)
+            with self.assertLogs("cart.storage", "WARNING"):
+                self.client.post(reverse("cart:cart_remove", args=[second.id]))
+                self.add(first, 3)
+                # сохраненная в Redis корзина недоступна, видна корзина сессии
+                self.assertEqual(len(self.get_cart()), 3)
+
+        # Redis снова доступен: изменения из сессии дополняют прежний хэш
+        self.add(second, 1)
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID], cart_id)
+        self.assertNotIn(RedisCartStorage.FALLBACK_SESSION_KEY, self.client.session)
+        cart = self.get_cart()
+        self.assertEqual(len(cart), 4)
+        self.assertEqual(cart.coupon, self.coupon)
+
+    def test_session_cart_replaces_loaded_hash(self):
+        first, second = self.products
+        self.add(first, 2)
+        self.add(second, 1)
+        cart_id = self.client.session[settings.CART_SESSION_ID]
+        # хэш прочитан, а запись не удалась: в сессии вся корзина
+        with mock.patch.object(
+            get_redis(), "pipeline", side_effect=redis.ConnectionError
+        ):
+            with self.assertLogs("cart.storage", "WARNING"):
+                self.client.post(reverse("cart:cart_remove", args=[second.id]))
+
+        self.add(first, 1)
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID], cart_id)
+        self.assertEqual(
+            set(get_redis().hkeys(f"cart:{cart_id}")), {str(first.id).encode()}
+        )
+        self.assertEqual(len(self.get_cart()), 3)
@@ -8,4 +8,10 @@ urlpatterns = [
     path("", views.cart_detail, name="cart_detail"),
     path("add/<int:product_id>/", views.cart_add, name="cart_add"),
     path("remove/<int:product_id>/", views.cart_remove, name="cart_remove"),
+    # JSON API для обновления корзины без перезагрузки страницы
+    path("api/", views.cart_api_summary, name="api_summary"),
+    path("api/add/<int:product_id>/", views.cart_api_add, name="api_add"),
+    path("api/update/<int:product_id>/", views.cart_api_update, name="api_update"),
+    path("api/remove/<int:product_id>/", views.cart_api_remove, name="api_remove"),
+    path("api/coupon/", views.cart_api_coupon, name="api_coupon"),
 ]
@@ -1,8 +1,12 @@
 from coupons.forms import CouponApplyForm
+from coupons.models import get_active_coupon
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from shop.models import Product
+from shop.money import Money
 from shop.recommender import Recommender
+from shop.templatetags.currency_tags import currency
 
 from .cart import Cart
 from .forms import CartAddProductForm
@@ -53,3 +57,88 @@ def cart_detail(request):
             "recommended_products": recommended_products,
         },
     )
+
+
+def cart_summary(cart, product_id=None):
+    """
+    Итоги корзины для JSON API. Суммы хранятся в рублях и форматируются
+    в валюте текущего языка, как в шаблонах
+    """
+    subtotal = cart.get_total_price()
+    discount = cart.get_discount()
+    shipping = cart.calculate_shipping_cost_base() if len(cart) else Money(0)
+    items_total = subtotal - discount
+    data = {
+        "items": len(cart),
+        "currency": cart.get_currency_info()["code"],
+        "subtotal": currency(subtotal),
+        "discount": currency(discount),
+        "shipping": currency(shipping),
+        "total": currency(items_total + shipping),
+    }
+    if product_id is not None:
+        # Измененная строка корзины, None - если товар удален
+        item = cart.cart.get(str(product_id))
+        data["item"] = item and {
+            "product_id": product_id,
+            "quantity": item["quantity"],
+            "total_price": currency(Money.parse(item["price"]) * item["quantity"]),
+        }
+    return data
+
+
+def form_errors(form):
+    return JsonResponse({"errors": form.errors}, status=400)
+
+
+@require_POST
+def cart_api_add(request, product_id):
+    cart = Cart(request)
+    product = get_object_or_404(Product, id=product_id)
+    form = CartAddProductForm(request.POST)
+    if not form.is_valid():
+        return form_errors(form)
+    cd = form.cleaned_data
+    cart.add(product=product, quantity=cd["quantity"], override_quantity=cd["override"])
+    return JsonResponse(cart_summary(cart, product_id))
+
+
+@require_POST
+def cart_api_update(request, product_id):
+    cart = Cart(request)
+    product = get_object_or_404(Product, id=product_id)
+    form = CartAddProductForm(request.POST)
+    if not form.is_valid():
+        return form_errors(form)
+    cart.add(
+        product=product,
+        quantity=form.cleaned_data["quantity"],
+        override_quantity=True,
+    )
+    return JsonResponse(cart_summary(cart, product_id))
+
+
+@require_POST
+def cart_api_remove(request, product_id):
+    cart = Cart(request)
+    product = get_object_or_404(Product, id=product_id)
+    cart.remove(product)
+    return JsonResponse(cart_summary(cart, product_id))
+
+
+@require_POST
+def cart_api_coupon(request):
+    cart = Cart(request)
+    form = CouponApplyForm(request.POST)
+    if not form.is_valid():
+        return form_errors(form)
+    coupon = get_active_coupon(form.cleaned_data["code"])
+    cart.set_coupon(coupon.id if coupon else None)
+    data = cart_summary(cart)
+    data["coupon"] = coupon and {"code": coupon.code, "discount": coupon.discount}
+    return JsonResponse(data)
+
+
+@require_GET
+def cart_api_summary(request):
+    return JsonResponse(cart_summary(Cart(request)))
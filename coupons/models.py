@@ -1,5 +1,6 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 
 class Coupon(models.Model):
@@ -14,3 +15,11 @@ class Coupon(models.Model):
 
     def __str__(self):
         return self.code
+
+
+def get_active_coupon(code):
+    """Действующий купон с указанным кодом или None"""
+    now = timezone.now()
+    return Coupon.objects.filter(
+        code__iexact=code, valid_form__lte=now, valid_to__gte=now, active=True
+    ).first()
@@ -1,22 +1,16 @@
+from cart.cart import Cart
 from django.shortcuts import redirect
-from django.utils import timezone
 from django.views.decorators.http import require_POST
 
 from .forms import CouponApplyForm
-from .models import Coupon
+from .models import get_active_coupon
 
 
 @require_POST
 def coupon_apply(request):
-    now = timezone.now()
+    cart = Cart(request)
     form = CouponApplyForm(request.POST)
     if form.is_valid():
-        code = form.cleaned_data["code"]
-        try:
-            coupon = Coupon.objects.get(
-                code__iexact=code, valid_form__lte=now, valid_to__gte=now, active=True
-            )
-            request.session["coupon_id"] = coupon.id
-        except Coupon.DoesNotExist:
-            request.session["coupon_id"] = None
+        coupon = get_active_coupon(form.cleaned_data["code"])
+        cart.set_coupon(coupon.id if coupon else None)
     return redirect("cart:cart_detail")
@@ -107,8 +107,31 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CART_SESSION_ID = "cart"
+# Хранилище корзины: "cart.storage.RedisCartStorage" (хэш в Redis) или
+# "cart.storage.SessionCartStorage" (сессия)
+CART_STORAGE = "cart.storage.RedisCartStorage"
+# Срок жизни корзины в Redis с последнего изменения (сек.)
+CART_TTL = 60 * 60 * 24 * 14
+# Количество товаров на странице каталога
+PRODUCTS_PER_PAGE = 24
+# Время жизни закэшированных страниц каталога (сек.)
+CATALOG_CACHE_TIMEOUT = 60 * 60
+# После стольких ошибок кэша подряд каталог CATALOG_CACHE_RESET_TIMEOUT секунд
+# отдается без кэша
+CATALOG_CACHE_FAILURE_THRESHOLD = 3
+CATALOG_CACHE_RESET_TIMEOUT = 30
+# Размер LRU-кэша slug -> id в каждом процессе
+SLUG_CACHE_SIZE = 1024
+# Максимальное число товаров в результатах поиска
+SEARCH_RESULTS_LIMIT = 100
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Ширина уменьшенных копий изображений товаров (пикс.)
+THUMBNAIL_SIZES = {
+    "small": 150,
+    "medium": 400,
+    "large": 800,
+}
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 STRIPE_PUBLISHABLE_KEY = config("STRIPE_PUBLISHABLE_KEY")
@@ -118,6 +141,44 @@ STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET")
 REDIS_HOST = "localhost"
 REDIS_PORT = "6379"
 REDIS_DB = 1
+REDIS_MAX_CONNECTIONS = 50
+# Таймауты соединения и операций с Redis (сек.)
+REDIS_SOCKET_CONNECT_TIMEOUT = 0.5
+REDIS_SOCKET_TIMEOUT = 0.5
+# Общий для всех процессов кэш (версии и страницы каталога, рекомендации,
+# перенаправления slug'ов) в отдельной базе Redis
+REDIS_CACHE_DB = 2
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_CACHE_DB}",
+        "OPTIONS": {
+            "max_connections": REDIS_MAX_CONNECTIONS,
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        },
+    }
+}
+# Хранилище совместных покупок для рекомендаций; для разработки и тестов
+# без Redis - "shop.recommender_backends.InProcessBackend"
+RECOMMENDER_BACKEND = "shop.recommender_backends.RedisBackend"
+# После стольких сбоев подряд хранилище рекомендаций не опрашивается
+# RECOMMENDER_RESET_TIMEOUT секунд
+RECOMMENDER_FAILURE_THRESHOLD = 3
+RECOMMENDER_RESET_TIMEOUT = 30
+# Сколько заказов запоминается, пока хранилище недоступно
+RECOMMENDER_BUFFER_SIZE = 1000
+# Сколько товаров, купленных вместе, хранится в Redis для каждого товара
+RECOMMENDER_MAX_PARTNERS = 500
+# Сколько лучших рекомендаций хранится в кэше для каждого товара
+RECOMMENDATIONS_TOP_K = 10
+# Полный пересчет кэша рекомендаций раз в сутки (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    "rebuild-recommendations": {
+        "task": "shop.tasks.rebuild_recommendations",
+        "schedule": 60 * 60 * 24,
+    },
+}
 # Настройка Django-parler
 PARLER_LANGUAGES = {
     None: (
@@ -130,8 +191,19 @@ PARLER_LANGUAGES = {
         "hide_untraslated": False,
     },
 }
+# Переводы витрины загружаются prefetch_related; кэш parler записывал бы
+# каждый прочитанный перевод в Redis, и без него страницы не открывались бы
+PARLER_ENABLE_CACHING = False
 CURRENCIES = {
     'en': {'code': 'USD', 'symbol': '$', 'rate': 0.012, 'stripe_currency': 'usd'},    # 1 RUB = 0.012 USD
     'es': {'code': 'EUR', 'symbol': '€', 'rate': 0.011, 'stripe_currency': 'eur'},    # 1 RUB = 0.011 EUR
     'ru': {'code': 'RUB', 'symbol': '₽', 'rate': 1.0, 'stripe_currency': 'rub'},      # 1 RUB = 1.0 RUB
-}
\ No newline at end of file
+}
+# Тарифы доставки в рублях по зонам: ступени (вес до, грамм; цена)
+# и доплата за каждый килограмм сверх последней ступени
+SHIPPING_RATES = {
+    'default': {
+        'tiers': [(1000, '500.00'), (5000, '800.00'), (10000, '1200.00')],
+        'per_kg': '100.00',
+    },
+}
@@ -1,8 +1,11 @@
 import csv
 import datetime
+import json
+from operator import attrgetter
 
 from django.contrib import admin
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
@@ -14,34 +17,104 @@ def order_detail(obj):
     return mark_safe(f'<a href="{url}">View</a>')
 
 
-def export_to_csv(modeladmin, request, queryset):
-    opts = modeladmin.model._meta
-    content_disposition = f"attachment; filename={opts.verbose_name}.csv"
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = content_disposition
-    writer = csv.writer(response)
-    fields = [
+# Заказов на один запрос к базе при выгрузке
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def export_fields(opts):
+    return [
         field
         for field in opts.get_fields()
         if not field.many_to_many and not field.one_to_many
     ]
-    # записать первую строку с информацие заголовка
-    writer.writerow([field.verbose_name for field in fields])
-    # записать строки данных
-    for obj in queryset:
-        data_row = []
-        for field in fields:
-            value = getattr(obj, field.name)
-            if isinstance(value, datetime.datetime):
-                value = value.strftime("%d/%m/%Y")
-            data_row.append(value)
-        writer.writerow(data_row)
+
+
+def export_rows(queryset):
+    """
+    Заказы порциями по EXPORT_CHUNK_SIZE: купон загружается JOIN,
+    позиции - одним запросом на порцию, в памяти только текущая порция
+    """
+    return (
+        queryset.select_related("coupon")
+        .prefetch_related("items")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def format_items(order):
+    return "; ".join(
+        f"{item.product_id} x {item.quantity} @ {item.price}"
+        for item in order.items.all()
+    )
+
+
+def streaming_export(filename, content_type, lines):
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
 
+def export_to_csv(modeladmin, request, queryset):
+    opts = modeladmin.model._meta
+    fields = export_fields(opts)
+    get_values = attrgetter(*[field.name for field in fields])
+    writer = csv.writer(Echo())
+
+    def lines():
+        # записать первую строку с информацие заголовка
+        yield writer.writerow([field.verbose_name for field in fields] + ["items"])
+        # записать строки данных
+        for obj in export_rows(queryset):
+            data_row = [
+                value.strftime("%d/%m/%Y")
+                if isinstance(value, datetime.datetime)
+                else value
+                for value in get_values(obj)
+            ]
+            data_row.append(format_items(obj))
+            yield writer.writerow(data_row)
+
+    return streaming_export(f"{opts.verbose_name}.csv", "text/csv", lines())
+
+
 export_to_csv.short_description = "Export to CSV"
 
 
+def export_to_jsonl(modeladmin, request, queryset):
+    opts = modeladmin.model._meta
+    fields = export_fields(opts)
+    names = [field.name for field in fields]
+    get_values = attrgetter(*names)
+
+    def lines():
+        for obj in export_rows(queryset):
+            data = dict(zip(names, get_values(obj)))
+            data["coupon"] = obj.coupon.code if obj.coupon else None
+            data["items"] = [
+                {
+                    "product": item.product_id,
+                    "price": item.price,
+                    "quantity": item.quantity,
+                }
+                for item in obj.items.all()
+            ]
+            yield json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+    return streaming_export(
+        f"{opts.verbose_name}.jsonl", "application/jsonl", lines()
+    )
+
+
+export_to_jsonl.short_description = "Export to JSON Lines"
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     raw_id_fields = ["product"]
@@ -83,5 +156,11 @@ class OrderAdmin(admin.ModelAdmin):
         order_pdf,
     ]
     list_filter = ["paid", "created", "updated"]
+    readonly_fields = ["subtotal", "discount_amount", "total_cost"]
     inlines = [OrderItemInline]
-    actions = [export_to_csv]
+    actions = [export_to_csv, export_to_jsonl]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # позиции, скидка или доставка могли измениться
+        form.instance.update_totals()
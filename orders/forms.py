@@ -4,6 +4,8 @@ from .models import Order
 
 
 class OrderCreateForm(forms.ModelForm):
+    checkout_token = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Order
         fields = ["first_name", "last_name", "email", "address", "postal_code", "city"]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_shipping_cost_order_shipping_cost_base_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='checkout_token',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_checkout_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Discount amount'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Total cost'),
+        ),
+    ]
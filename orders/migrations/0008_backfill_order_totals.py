@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:33
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+CENT = Decimal("0.01")
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+
+    # Суммы всех заказов считаются одним запросом с агрегатом по позициям
+    orders = Order.objects.annotate(
+        items_subtotal=Sum(
+            F("items__price") * F("items__quantity"),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    ).only("id", "discount", "shipping_cost")
+    batch = []
+    for order in orders.iterator(chunk_size=500):
+        subtotal = Decimal(order.items_subtotal or 0).quantize(CENT, ROUND_HALF_UP)
+        # как Money.percent: половина копейки округляется вверх
+        discount = (subtotal * order.discount / 100).quantize(CENT, ROUND_HALF_UP)
+        order.subtotal = subtotal
+        order.discount_amount = discount
+        order.total_cost = subtotal - discount + order.shipping_cost
+        batch.append(order)
+        if len(batch) >= 500:
+            Order.objects.bulk_update(
+                batch, ["subtotal", "discount_amount", "total_cost"]
+            )
+            batch = []
+    Order.objects.bulk_update(batch, ["subtotal", "discount_amount", "total_cost"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
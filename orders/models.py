@@ -4,7 +4,10 @@ from coupons.models import Coupon
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Sum
 from django.utils.translation import gettext_lazy as _
+from shop.money import Money
+from shop.shipping import get_shipping_cost
 
 
 class Order(models.Model):
@@ -53,6 +56,20 @@ class Order(models.Model):
         blank=True,
         verbose_name=_("Shipping method")
     )
+    # Токен формы оформления: повторная отправка формы не создает второй заказ
+    checkout_token = models.UUIDField(
+        unique=True, null=True, blank=True, editable=False
+    )
+    # Суммы в валюте заказа, пересчитываются update_totals
+    subtotal = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name=_("Subtotal")
+    )
+    discount_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name=_("Discount amount")
+    )
+    total_cost = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name=_("Total cost")
+    )
 
     class Meta:
         ordering = ["-created"]
@@ -64,51 +81,64 @@ class Order(models.Model):
         return f"Order {self.id}"
     
     def calculate_total_weight(self):
-        """Рассчитывает общий вес заказа"""
-        total_weight = sum(
-            item.product.weight * item.quantity for item in self.items.all()
-        )
-        return total_weight
+        """Рассчитывает общий вес заказа одним агрегирующим запросом"""
+        total_weight = self.items.aggregate(
+            weight=Sum(
+                F("product__weight") * F("quantity"),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )["weight"]
+        return total_weight or Decimal(0)
 
     def calculate_shipping_cost_base(self):
         """Рассчитывает стоимость доставки в базовой валюте (рублях)"""
-        total_weight = self.calculate_total_weight()
-        
-        # Тарифы доставки в РУБЛЯХ (базовая валюта)
-        if total_weight <= 1000:  # до 1 кг
-            return Decimal('500.00')  # 500 руб
-        elif total_weight <= 5000:  # до 5 кг
-            return Decimal('800.00')  # 800 руб
-        elif total_weight <= 10000:  # до 10 кг
-            return Decimal('1200.00')  # 1200 руб
-        else:  # свыше 10 кг
-            return Decimal('1200.00') + (total_weight - 10000) / 1000 * Decimal('100.00')
+        return get_shipping_cost(self.calculate_total_weight()).to_decimal()
 
     def get_shipping_cost_in_order_currency(self):
         """Возвращает стоимость доставки в валюте заказа"""
         shipping_base = self.shipping_cost_base
         # Конвертируем из рублей в валюту заказа
-        return shipping_base * self.exchange_rate
-    
+        return Money.from_decimal(shipping_base * self.exchange_rate, self.currency)
+
+    def money(self, value):
+        """Сумма в валюте заказа"""
+        return Money.from_decimal(value, self.currency)
+
+    def update_totals(self, save=True):
+        """
+        Пересчитывает сохраненные суммы заказа по позициям одним
+        агрегирующим запросом. Вызывается после изменения позиций.
+        """
+        subtotal = self.items.aggregate(
+            subtotal=Sum(
+                F("price") * F("quantity"),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )["subtotal"]
+        subtotal = self.money(subtotal or 0)
+        discount = subtotal.percent(self.discount)
+        total = subtotal - discount + self.money(self.shipping_cost)
+        self.subtotal = subtotal.to_decimal()
+        self.discount_amount = discount.to_decimal()
+        self.total_cost = total.to_decimal()
+        if save:
+            self.save(
+                update_fields=["subtotal", "discount_amount", "total_cost", "updated"]
+            )
+
     def get_total_cost_before_discount(self):
-        return sum(item.get_cost() for item in self.items.all())
+        return self.money(self.subtotal)
 
     def get_discount(self):
-        total_cost = self.get_total_cost_before_discount()
-        if self.discount:
-            return total_cost * (self.discount / Decimal(100))
-        return Decimal(0)
+        return self.money(self.discount_amount)
 
     def get_total_cost(self):
-        """ОБНОВИТЕ ЭТОТ МЕТОД - должен включать доставку!"""
-        total_cost = self.get_total_cost_before_discount()
-        total_with_discount = total_cost - self.get_discount()
-        return total_with_discount + self.shipping_cost
-    
+        """Стоимость товаров со скидкой и доставкой"""
+        return self.money(self.total_cost)
+
     def get_items_total(self):
         """Стоимость только товаров (без доставки)"""
-        total_cost = self.get_total_cost_before_discount()
-        return total_cost - self.get_discount()
+        return self.get_total_cost_before_discount() - self.get_discount()
     
     # ДОБАВИТЬ МЕТОДЫ ДЛЯ ВАЛЮТ
     def get_total_in_original_currency(self):
@@ -117,12 +147,9 @@ class Order(models.Model):
     
     def format_price(self, price):
         """Форматирует цену согласно валюте заказа"""
-        if self.currency == 'RUB':
-            return f"{price:,.2f} {self.get_currency_symbol()}".replace(',', ' ').replace('.', ',')
-        elif self.currency == 'EUR':
-            return f"{self.get_currency_symbol()}{price:,.2f}"
-        else:  # USD
-            return f"{self.get_currency_symbol()}{price:,.2f}"
+        if not isinstance(price, Money):
+            price = self.money(price)
+        return price.format()
     
     def get_currency_symbol(self):
         """Возвращает символ валюты"""
@@ -150,5 +177,8 @@ class OrderItem(models.Model):
     def __str__(self):
         return str(self.id)
 
+    def get_price(self):
+        return self.order.money(self.price)
+
     def get_cost(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.get_price() * self.quantity
\ No newline at end of file
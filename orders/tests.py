@@ -1,3 +1,221 @@
-from django.test import TestCase
+import csv
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from coupons.models import Coupon
+from django.contrib.admin.sites import site
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
+from shop.models import Category, Product
+from shop.testing import setUpModule  # noqa: F401
+
+from .admin import OrderAdmin, export_to_csv, export_to_jsonl
+from .models import Order, OrderItem
+
+CHECKOUT_DATA = {
+    "first_name": "Каа",
+    "last_name": "Питон",
+    "email": "kaa@example.com",
+    "address": "Джунгли, 1",
+    "postal_code": "123456",
+    "city": "Сеони",
+}
+
+
+@override_settings(
+    CART_STORAGE="cart.storage.SessionCartStorage",
+    RECOMMENDER_BACKEND="shop.recommender_backends.InProcessBackend",
+)
+class OrderCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Ужи", slug="uzhi")
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Уж {i}",
+                slug=f"uzh-{i}",
+                price=Decimal("300.00"),
+                weight=Decimal("750.00"),
+            )
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+        patcher = mock.patch("orders.views.order_created")
+        self.order_created = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fill_cart(self, products):
+        for product in products:
+            self.client.post(
+                reverse("cart:cart_add", args=[product.id]), {"quantity": 2}
+            )
+
+    def checkout(self, token=None):
+        data = {**CHECKOUT_DATA, "checkout_token": token or uuid.uuid4()}
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse("orders:order_create"), data)
+        self.assertRedirects(
+            response, reverse("payment:process"), fetch_redirect_response=False
+        )
+        return len(queries)
+
+    def test_order_is_created_in_one_pass(self):
+        self.fill_cart(self.products[:3])
+        with mock.patch("orders.views.Recommender") as recommender:
+            self.checkout()
+        order = Order.objects.get()
+        self.assertEqual(order.currency, "RUB")
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.get_total_cost_before_discount().amount, 180000)
+        self.order_created.delay.assert_called_once_with(order.id)
+        recommender.return_value.products_bought.assert_called_once_with(
+            self.products[:3]
+        )
+        self.assertEqual(self.client.session["order_id"], order.id)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.fill_cart(self.products[:2])
+        small = self.checkout()
+        self.fill_cart(self.products)
+        large = self.checkout()
+        self.assertEqual(small, large)
+        self.assertEqual(OrderItem.objects.count(), 12)
+
+    def test_failed_items_insert_leaves_no_order(self):
+        self.fill_cart(self.products[:2])
+        with mock.patch.object(
+            OrderItem.objects, "bulk_create", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.checkout()
+        self.assertFalse(Order.objects.exists())
+        self.order_created.delay.assert_not_called()
+
+    def test_failed_side_effects_do_not_break_checkout(self):
+        self.fill_cart(self.products[:2])
+        self.order_created.delay.side_effect = ConnectionError
+        with mock.patch("orders.views.Recommender", side_effect=ConnectionError):
+            with self.assertLogs("django", "ERROR") as logs:
+                self.checkout()
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(Order.objects.exists())
+        # корзина очищена
+        response = self.client.get(reverse("cart:cart_detail"))
+        self.assertEqual(len(response.context["cart"]), 0)
+
+    def test_repeated_submit_returns_existing_order(self):
+        response = self.client.get(reverse("orders:order_create"))
+        token = uuid.UUID(response.context["form"]["checkout_token"].value())
+        self.assertContains(response, f'value="{token}"')
+
+        self.fill_cart(self.products[:2])
+        self.checkout(token)
+        order = Order.objects.get()
+        self.assertEqual(order.checkout_token, token)
+
+        # второй клик: корзина уже пуста, заказ тот же
+        session = self.client.session
+        del session["order_id"]
+        session.save()
+        self.checkout(token)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(self.client.session["order_id"], order.id)
+        self.order_created.delay.assert_called_once_with(order.id)
+
+    def test_totals_are_stored_and_resynced(self):
+        self.fill_cart(self.products[:2])
+        self.checkout()
+        order = Order.objects.get()
+        shipping = order.money(order.shipping_cost)
+        with self.assertNumQueries(0):
+            subtotal = order.get_total_cost_before_discount()
+            self.assertEqual(subtotal.amount, 120000)
+            self.assertEqual(order.get_discount().amount, 0)
+            self.assertEqual(order.get_total_cost(), subtotal + shipping)
+
+        # позиция изменена, как в инлайне админки
+        item = order.items.first()
+        item.quantity = 5
+        item.save()
+        order.discount = 10
+        with self.assertNumQueries(2):
+            order.update_totals()
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("2100.00"))
+        self.assertEqual(order.discount_amount, Decimal("210.00"))
+        self.assertEqual(order.total_cost, Decimal("1890.00") + order.shipping_cost)
+
+    def test_order_weight_is_one_query(self):
+        self.fill_cart(self.products[:3])
+        self.checkout()
+        order = Order.objects.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(order.calculate_total_weight(), Decimal("4500.00"))
+        self.assertEqual(order.shipping_weight, Decimal("4500.00"))
+        with self.assertNumQueries(1):
+            shipping = order.calculate_shipping_cost_base()
+        self.assertEqual(shipping, Decimal("800.00"))
+        self.assertEqual(order.shipping_cost_base, shipping)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Ужи", slug="uzhi")
+        product = Product.objects.create(
+            category=category, name="Уж", slug="uzh", price=Decimal("300.00")
+        )
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code="SNAKE10",
+            valid_form=now - timedelta(days=1),
+            valid_to=now + timedelta(days=1),
+            discount=10,
+            active=True,
+        )
+        for i in range(5):
+            order = Order.objects.create(
+                **CHECKOUT_DATA, coupon=coupon if i % 2 else None, currency="RUB"
+            )
+            OrderItem.objects.create(
+                order=order, product=product, price=Decimal("300.00"), quantity=i + 1
+            )
+            order.update_totals()
+
+    def export(self, action):
+        response = action(OrderAdmin(Order, site), None, Order.objects.order_by("id"))
+        # купоны и позиции не добавляют запросов на каждый заказ
+        with self.assertNumQueries(2):
+            return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(self.export(export_to_csv).splitlines()))
+        self.assertEqual(len(rows), 6)
+        header = rows[0]
+        self.assertEqual(header[-1], "items")
+        first = dict(zip(header, rows[1]))
+        self.assertEqual(first["coupon"], "")
+        self.assertTrue(first["items"].endswith("x 1 @ 300.00"))
+        self.assertEqual(dict(zip(header, rows[2]))["coupon"], "SNAKE10")
+
+    def test_jsonl(self):
+        lines = self.export(export_to_jsonl).splitlines()
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual(len(orders), 5)
+        self.assertEqual(orders[1]["coupon"], "SNAKE10")
+        last = orders[-1]
+        self.assertEqual(last["coupon"], None)
+        self.assertEqual(last["items"][0]["quantity"], 5)
+        self.assertEqual(last["total_cost"], "1500.00")
@@ -1,107 +1,135 @@
+import logging
+import uuid
+
 import weasyprint
 from cart.cart import Cart
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.staticfiles import finders
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.conf import settings
 from decimal import Decimal
+from shop.money import Money, get_currency, get_currency_by_code
+from shop.recommender import Recommender
 
 from .forms import OrderCreateForm
 from .models import Order, OrderItem
 from .tasks import order_created
 
+logger = logging.getLogger(__name__)
+
+
+def checkout_done(request, order):
+    # задать заказ в сеансе
+    request.session["order_id"] = order.id
+    # перенаправлять к платежу
+    return redirect(reverse("payment:process"))
+
 
 def order_create(request):
     cart = Cart(request)
     if request.method == "POST":
         form = OrderCreateForm(request.POST)
         if form.is_valid():
+            token = form.cleaned_data["checkout_token"] or uuid.uuid4()
+            existing = Order.objects.filter(checkout_token=token).first()
+            if existing:
+                # повторная отправка формы: заказ уже создан
+                logger.info("Повторное оформление заказа %s", existing.id)
+                return checkout_done(request, existing)
+
             order = form.save(commit=False)
-            
-            currency_info = cart.get_currency_info()
-            order.currency = currency_info['code']
-            order.exchange_rate = Decimal(str(currency_info['rate']))
-            
-            # ОТЛАДКА
-            print(f"🔍 DEBUG: Cart total = {cart.get_total_price_after_discount()}")
-            print(f"🔍 DEBUG: Currency = {order.currency}, Rate = {order.exchange_rate}")
-            
+            order.checkout_token = token
+
+            currency = get_currency()
+            order.currency = currency.code
+            order.exchange_rate = (
+                Decimal(currency.rate_numerator) / currency.rate_denominator
+            )
+
+            # Один проход по корзине: позиции с товарами и ценами в рублях
+            lines = [
+                (
+                    item["product"],
+                    Money.from_decimal(item["product"].price),
+                    item["quantity"],
+                )
+                for item in cart
+                if "product" in item
+            ]
+            coupon = cart.coupon
+
             # Рассчитываем доставку
             order.shipping_weight = cart.get_total_weight()
             shipping_base = cart.calculate_shipping_cost_base()
-            order.shipping_cost_base = shipping_base
-            order.shipping_cost = shipping_base * order.exchange_rate
-
-            print(f"🔍 SHIPPING: {shipping_base} RUB * {order.exchange_rate} = {order.shipping_cost} {order.currency}")
-
-            # ВАЖНО: original_total в USD (базовой валюте)
-            total_in_rub = Decimal('0')
-            for item in cart:
-                total_in_rub += item["product"].price * item["quantity"]
-            
-            if cart.coupon:
-                discount_amount = total_in_rub * (cart.coupon.discount / Decimal(100))
-                total_in_rub -= discount_amount
-            
-            # Конвертируем в USD (базовая валюта)
-            usd_rate = Decimal('0.012')  # 1 RUB = 0.012 USD
-            order.original_total = total_in_rub * usd_rate
-            
-            order.shipping_method = "standard"
+            order.shipping_cost_base = shipping_base.to_decimal()
+            order.shipping_cost = shipping_base.convert(currency).to_decimal()
+
+            # original_total в USD (базовой валюте)
+            total_in_rub = sum(
+                (price * quantity for _, price, quantity in lines), Money(0)
+            )
+            if coupon:
+                total_in_rub -= total_in_rub.percent(coupon.discount)
+                order.coupon = coupon
+                order.discount = coupon.discount
+            order.original_total = total_in_rub.convert(
+                get_currency_by_code("USD")
+            ).to_decimal()
 
-            if cart.coupon:
-                order.coupon = cart.coupon
-                order.discount = cart.coupon.discount
-            
-            # ДОБАВЬТЕ ОТЛАДКУ ПЕРЕД СОХРАНЕНИЕМ
-            print(f"🔍 BEFORE SAVE - shipping_cost: {order.shipping_cost}")
-            print(f"🔍 BEFORE SAVE - original_total: {order.original_total}")
-            
-            order.save()
-
-            # ИСПРАВЛЕНИЕ: Правильная конвертация цен для OrderItem
-            for item in cart:
-                # Получаем оригинальную цену в рублях
-                original_price_rub = item["product"].price
-                # Конвертируем в валюту заказа
-                price_in_currency = original_price_rub * order.exchange_rate
-                
-                print(f"🔍 ITEM PRICE: {item['product'].name} - {original_price_rub} RUB -> {price_in_currency} {order.currency}")
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=item["product"],
-                    price=price_in_currency,  # Конвертированная цена
-                    quantity=item["quantity"],
-                )
-
-            # ДОБАВЬТЕ ЭТОТ КОД - запись рекомендаций
-            if len(cart) > 1:  # Если в корзине больше 1 товара
-                from shop.recommender import Recommender
+            order.shipping_method = "standard"
 
-                r = Recommender()
-                cart_products = [item["product"] for item in cart]
-                print(
-                    f"✅ Записываем рекомендации для товаров: {[p.id for p in cart_products]}"
-                )
-                r.products_bought(cart_products)
+            # Заказ и все позиции сохраняются вместе или не сохраняются вовсе
+            try:
+                with transaction.atomic():
+                    order.save()
+                    OrderItem.objects.bulk_create(
+                        OrderItem(
+                            order=order,
+                            product=product,
+                            # цена в валюте заказа
+                            price=price.convert(currency).to_decimal(),
+                            quantity=quantity,
+                        )
+                        for product, price, quantity in lines
+                    )
+                    order.update_totals()
+                    products = [product for product, _, _ in lines]
+                    # письмо и рекомендации - только после фиксации транзакции;
+                    # их ошибки записываются в лог и не мешают оформить заказ
+                    transaction.on_commit(
+                        lambda: order_created.delay(order.id), robust=True
+                    )
+                    if len(products) > 1:
+                        transaction.on_commit(
+                            lambda: Recommender().products_bought(products),
+                            robust=True,
+                        )
+            except IntegrityError:
+                # параллельный запрос с тем же токеном успел создать заказ
+                existing = Order.objects.filter(checkout_token=token).first()
+                if existing is None:
+                    raise
+                logger.info("Повторное оформление заказа %s", existing.id)
+                return checkout_done(request, existing)
+
+            logger.info(
+                "Создан заказ %s: позиций %s, итого %s, доставка %s %s",
+                order.id,
+                len(lines),
+                total_in_rub,
+                order.shipping_cost,
+                order.currency,
+            )
 
             # Очистить корзину
             cart.clear()
-
-            # Загружать асинхронные задания
-            order_created.delay(order.id)
-
-            # задать заказ в сеансе
-            request.session["order_id"] = order.id
-
-            # перенаправлять к платежу
-            return redirect(reverse("payment:process"))
+            return checkout_done(request, order)
     else:
-        form = OrderCreateForm()
+        form = OrderCreateForm(initial={"checkout_token": uuid.uuid4()})
     return render(request, "orders/order/create.html", {"cart": cart, "form": form})
 
 
@@ -1,4 +1,5 @@
 import stripe
+from cart.cart import Cart
 from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
@@ -50,11 +51,8 @@ def payment_process(request):
 
         # Добавляем товары заказа с правильной валютой
         for item in order.items.all():
-            # Конвертируем цену в минимальные единицы валюты (центы/копейки)
-            if stripe_currency == "rub":
-                unit_amount = int(item.price * 100)  # рубли в копейки
-            else:
-                unit_amount = int(item.price * 100)  # доллары/евро в центы
+            # Цена в минимальных единицах валюты (центы/копейки)
+            unit_amount = order.money(item.price).amount
 
             session_data["line_items"].append(
                 {
@@ -72,10 +70,7 @@ def payment_process(request):
             )
         # ДОБАВЬТЕ СТОИМОСТЬ ДОСТАВКИ КАК ОТДЕЛЬНЫЙ ЭЛЕМЕНТ
         if order.shipping_cost > 0:
-            if stripe_currency == "rub":
-                shipping_amount = int(order.shipping_cost * 100)
-            else:
-                shipping_amount = int(order.shipping_cost * 100)
+            shipping_amount = order.money(order.shipping_cost).amount
 
             # Локализованное название доставки
             shipping_names = {
@@ -160,9 +155,8 @@ def payment_process(request):
 
 
 def payment_completed(request):
-    # Очищаем сессию корзины после успешной оплаты
-    if "cart" in request.session:
-        del request.session["cart"]
+    # Очищаем корзину после успешной оплаты
+    Cart(request).clear()
     if "order_id" in request.session:
         del request.session["order_id"]
 
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from parler.admin import TranslatableAdmin
 
+from . import thumbnails
 from .models import Category, Product, ProductImage
 
 
@@ -20,7 +21,7 @@ class ProductImageInline(admin.TabularInline):
 
     def image_preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-height: 100px; max-width: 100px;" />'
+            return f'<img src="{thumbnails.thumbnail_url(obj.image, "small")}" style="max-height: 100px; max-width: 100px;" />'
         return "No image"
 
     image_preview.allow_tags = True
@@ -54,7 +55,7 @@ class ProductAdmin(TranslatableAdmin):
 
     def main_image_preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-height: 100px; max-width: 100px;" />'
+            return f'<img src="{thumbnails.thumbnail_url(obj.image, "small")}" style="max-height: 100px; max-width: 100px;" />'
         return "No image"
 
     main_image_preview.allow_tags = True
@@ -80,7 +81,7 @@ class ProductImageAdmin(admin.ModelAdmin):
 
     def image_preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-height: 50px; max-width: 50px;" />'
+            return f'<img src="{thumbnails.thumbnail_url(obj.image, "small")}" style="max-height: 50px; max-width: 50px;" />'
         return "No image"
 
     image_preview.allow_tags = True
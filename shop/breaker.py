@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold сбоев подряд обращения к хранилищу
+    пропускаются reset_timeout секунд, затем разрешается одна пробная
+    попытка: при успехе работа восстанавливается, при сбое пауза повторяется
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # пока идет пробная попытка, остальные запросы ее не дублируют
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
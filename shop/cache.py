@@ -0,0 +1,116 @@
+"""
+Версионированный кэш каталога.
+
+Каждая область каталога ("categories", "products:all", "products:<id>",
+"recommendations:<id>") имеет версию, которая входит в ключи кэша. Версия -
+это время последнего изменения области в наносекундах: сигналы моделей
+(и Recommender для рекомендаций) обновляют ее при изменениях, поэтому устаревшие записи просто перестают использоваться
+и вытесняются по таймауту, а версия годится для Last-Modified.
+
+Ошибка кэша считается промахом: данные вычисляются заново, а после
+нескольких ошибок подряд предохранитель на время отключает обращения к кэшу.
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+
+from .breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+breaker = CircuitBreaker(
+    settings.CATALOG_CACHE_FAILURE_THRESHOLD, settings.CATALOG_CACHE_RESET_TIMEOUT
+)
+
+CATEGORIES = "categories"
+ALL_PRODUCTS = "products:all"
+
+
+def category_scope(category_id):
+    return f"products:{category_id}"
+
+
+def recommendations_scope(product_id):
+    return f"recommendations:{product_id}"
+
+
+def _version_key(scope):
+    return f"catalog:version:{scope}"
+
+
+MISSING = object()
+
+
+def call(method, *args, default=None):
+    """
+    Вызывает метод кэша через предохранитель. Возвращает default, если
+    кэш недоступен
+    """
+    if not breaker.allow():
+        return default
+    try:
+        result = method(*args)
+    except redis.RedisError:
+        logger.warning("Кэш каталога недоступен", exc_info=True)
+        breaker.record_failure()
+        return default
+    breaker.record_success()
+    return result
+
+
+def get_versions(*scopes):
+    """Возвращает версии областей одним обращением к кэшу"""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = call(cache.get_many, keys)
+    if versions is None:
+        # Без кэша версии неизвестны: каждая страница считается новой
+        return (time.time_ns(),) * len(keys)
+    for key in keys:
+        if key not in versions:
+            # После вытеснения ключа версии не возвращаемся к номеру
+            # уже закэшированных страниц
+            now = time.time_ns()
+            call(cache.add, key, now, None)
+            versions[key] = call(cache.get, key) or now
+    return tuple(versions[key] for key in keys)
+
+
+def get_version(scope):
+    return get_versions(scope)[0]
+
+
+def bump_version(*scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    current = call(cache.get_many, keys, default=MISSING)
+    if current is not MISSING:
+        now = time.time_ns()
+        # Новая версия всегда больше прежней, даже при грубом таймере
+        versions = {key: max(now, current.get(key, 0) + 1) for key in keys}
+        if call(cache.set_many, versions, None, default=MISSING) is not MISSING:
+            return
+    # Страницы областей останутся в кэше до CATALOG_CACHE_TIMEOUT
+    logger.error("Не удалось обновить версии каталога: %s", ", ".join(scopes))
+
+
+def version_timestamp(*versions):
+    """Время последнего изменения для набора версий"""
+    return datetime.fromtimestamp(max(versions) / 1e9, tz=timezone.utc)
+
+
+def make_key(*parts):
+    raw = ":".join(str(part) for part in parts)
+    return f"catalog:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def get_or_set(parts, default):
+    key = make_key(*parts)
+    value = call(cache.get, key, MISSING, default=MISSING)
+    if value is MISSING:
+        value = default()
+        call(cache.set, key, value, settings.CATALOG_CACHE_TIMEOUT)
+    return value
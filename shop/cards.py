@@ -0,0 +1,94 @@
+"""
+Построение денормализованных карточек товаров (ProductCard).
+
+Для каждого товара создается по карточке на каждый язык из
+settings.LANGUAGES. Если перевода на язык нет, используются резервные
+языки parler, как и при обычном отображении товара.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product, ProductCard
+
+
+def get_languages():
+    return [code for code, name in settings.LANGUAGES]
+
+
+def build_cards(product):
+    """Возвращает несохраненные карточки товара для всех языков"""
+    cards = []
+    for language in get_languages():
+        name = product.safe_translation_getter(
+            "name", language_code=language, any_language=True
+        )
+        if name is None:
+            # У товара нет ни одного перевода
+            return []
+        cards.append(
+            ProductCard(
+                product=product,
+                language_code=language,
+                category_id=product.category_id,
+                category_slug=product.category.safe_translation_getter(
+                    "slug", default="", language_code=language, any_language=True
+                ),
+                name=name,
+                slug=product.safe_translation_getter(
+                    "slug", language_code=language, any_language=True
+                ),
+                image=product.image.name,
+                price=product.price,
+                weight=product.weight,
+                available=product.available,
+                created=product.created,
+                updated=product.updated,
+            )
+        )
+    return cards
+
+
+def _products_with_translations():
+    return Product.objects.select_related("category").prefetch_related(
+        "translations", "category__translations"
+    )
+
+
+def refresh_cards(product_ids):
+    """Пересобирает карточки указанных товаров"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    cards = []
+    for product in _products_with_translations().filter(id__in=product_ids):
+        cards.extend(build_cards(product))
+    with transaction.atomic():
+        ProductCard.objects.filter(product_id__in=product_ids).delete()
+        ProductCard.objects.bulk_create(cards)
+
+
+def refresh_category_cards(category_id):
+    product_ids = Product.objects.filter(category_id=category_id).values_list(
+        "id", flat=True
+    )
+    refresh_cards(product_ids)
+
+
+def rebuild_cards(batch_size=500):
+    """Полностью перестраивает таблицу карточек, возвращает число карточек"""
+    count = 0
+    with transaction.atomic():
+        ProductCard.objects.all().delete()
+        products = _products_with_translations().order_by("id")
+        last_id = 0
+        while True:
+            batch = list(products.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            cards = []
+            for product in batch:
+                cards.extend(build_cards(product))
+            ProductCard.objects.bulk_create(cards)
+            count += len(cards)
+            last_id = batch[-1].id
+    return count
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Кэши, которые видит только один процесс
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Кэш рекомендаций заполняют celery-задание rebuild_recommendations и
+    команды rebuild_copurchases/clear_copurchases, а читают веб-процессы:
+    с кэшем в памяти процесса их записи никто не увидит
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f"Кэш по умолчанию ({backend}) не общий для процессов.",
+            hint=(
+                "Пересчет рекомендаций в celery и сброс версий каталога не "
+                "будут видны веб-процессам; настройте общий кэш, например "
+                "django.core.cache.backends.redis.RedisCache."
+            ),
+            id="shop.W001",
+        )
+    ]
@@ -0,0 +1,30 @@
+"""
+Валидаторы условных GET-запросов (ETag / Last-Modified) для каталога.
+
+Кроме данных каталога страница зависит от посетителя: в шапке выводится
+корзина, а в формах - CSRF-токен. Поэтому они входят в ETag, а
+Last-Modified отдается только для страниц без персональных данных
+(поисковые роботы, новые посетители).
+"""
+import hashlib
+
+from cart.storage import get_cart_storage
+
+
+def visitor_state(request):
+    cart = get_cart_storage(request).items
+    items = sorted(
+        (product_id, item["quantity"], str(item["price"]))
+        for product_id, item in cart.items()
+    )
+    return items, request.META.get("CSRF_COOKIE")
+
+
+def is_personalized(request):
+    items, csrf_cookie = visitor_state(request)
+    return bool(items or csrf_cookie)
+
+
+def make_etag(request, *parts):
+    raw = repr((request.LANGUAGE_CODE, parts, visitor_state(request)))
+    return hashlib.md5(raw.encode()).hexdigest()
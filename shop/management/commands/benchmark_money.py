@@ -0,0 +1,85 @@
+import timeit
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.money import Money, get_currency, parse_amount
+
+
+def decimal_total(items, rate, discount):
+    """Прежний расчет: Decimal(str(...)) на каждую цену и курс"""
+    total = sum(Decimal(item["price"]) * item["quantity"] for item in items)
+    total -= (discount / Decimal(100)) * total
+    converted = round(Decimal(str(total)) * Decimal(str(rate)), 2)
+    return int(converted * 100)
+
+
+def money_total(items, currency, discount):
+    # как Cart.get_total_price: целые копейки, один объект Money
+    total = Money(
+        sum(parse_amount(item["price"]) * item["quantity"] for item in items)
+    )
+    total -= total.percent(discount)
+    return total.convert(currency).amount
+
+
+def decimal_lines(items, rate):
+    """Прежний фильтр currency: курс разбирается для каждой строки"""
+    lines = []
+    for item in items:
+        total = Decimal(item["price"]) * item["quantity"]
+        lines.append(round(Decimal(str(total)) * Decimal(str(rate)), 2))
+    return lines
+
+
+def money_lines(items, currency):
+    return [
+        Money(parse_amount(item["price"]) * item["quantity"]).convert(currency)
+        for item in items
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает расчет суммы корзины для Stripe на Decimal и на Money "
+        "(целые копейки)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=10000)
+        parser.add_argument("--language", default="en")
+
+    def handle(self, *args, **options):
+        items = [
+            {"price": f"{100 + i * 37}.{i % 100:02d}", "quantity": i % 3 + 1}
+            for i in range(options["items"])
+        ]
+        rate = settings.CURRENCIES[options["language"]]["rate"]
+        currency = get_currency(options["language"])
+        discount = 10
+        repeat = options["repeat"]
+
+        timings = {
+            "Сумма, Decimal": timeit.timeit(
+                lambda: decimal_total(items, rate, discount), number=repeat
+            ),
+            "Сумма, Money": timeit.timeit(
+                lambda: money_total(items, currency, discount), number=repeat
+            ),
+            "Строки в валюте, Decimal": timeit.timeit(
+                lambda: decimal_lines(items, rate), number=repeat
+            ),
+            "Строки в валюте, Money": timeit.timeit(
+                lambda: money_lines(items, currency), number=repeat
+            ),
+        }
+
+        self.stdout.write(f"Позиций в корзине: {len(items)}, валюта: {currency.code}")
+        self.stdout.write(
+            f"Сумма для Stripe: Decimal={decimal_total(items, rate, discount)}, "
+            f"Money={money_total(items, currency, discount)}"
+        )
+        for name, elapsed in timings.items():
+            self.stdout.write(f"{name}: {elapsed / repeat * 1_000_000:.1f} мкс на расчет")
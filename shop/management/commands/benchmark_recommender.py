@@ -0,0 +1,66 @@
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from redis.connection import Connection
+
+from shop.recommender_backends import get_backend
+
+
+@contextmanager
+def count_round_trips():
+    """Считает отправки команд на сервер Redis (один пакет - один обмен)"""
+    counter = {"round_trips": 0}
+    send_packed_command = Connection.send_packed_command
+
+    def counting_send(connection, *args, **kwargs):
+        counter["round_trips"] += 1
+        return send_packed_command(connection, *args, **kwargs)
+
+    with mock.patch.object(Connection, "send_packed_command", counting_send):
+        yield counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет число сетевых обменов с Redis и время обновления "
+        "рекомендаций (add_purchases хранилища) на один заказ. Кэш каталога "
+        "не используется, поэтому считаются только обмены хранилища"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--basket-size", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=100)
+
+    def handle(self, *args, **options):
+        basket_size = options["basket_size"]
+        orders = options["orders"]
+        # Отрицательные id не пересекаются с настоящими товарами
+        product_ids = [-i for i in range(1, basket_size + 1)]
+        backend = get_backend()
+
+        def add_purchases():
+            backend.add_purchases(
+                product_ids,
+                max_partners=settings.RECOMMENDER_MAX_PARTNERS,
+                top_k=settings.RECOMMENDATIONS_TOP_K,
+            )
+
+        try:
+            # соединение открывается до замера, его команды не считаются
+            add_purchases()
+            with count_round_trips() as counter:
+                started = time.perf_counter()
+                for _ in range(orders):
+                    add_purchases()
+                elapsed = time.perf_counter() - started
+        finally:
+            backend.remove(product_ids)
+
+        self.stdout.write(f"Хранилище: {type(backend).__name__}")
+        self.stdout.write(f"Товаров в заказе: {basket_size}")
+        self.stdout.write(f"Увеличений баллов: {basket_size * (basket_size - 1)}")
+        self.stdout.write(f"Сетевых обменов на заказ: {counter['round_trips'] / orders:.1f}")
+        self.stdout.write(f"Среднее время на заказ: {elapsed / orders * 1000:.2f} мс")
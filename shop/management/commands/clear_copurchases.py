@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommender import Recommender
+
+
+class Command(BaseCommand):
+    help = "Удаляет из Redis все данные о совместных покупках товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Пауза между пачками в секундах",
+        )
+
+    def handle(self, *args, **options):
+        recommender = Recommender()
+        deleted = recommender.clear_puchases(
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            progress=lambda count: self.stdout.write(f"Удалено ключей: {count}"),
+        )
+        # Кэш рекомендаций страниц товаров заполняется заново
+        recommender.rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f"Всего удалено ключей: {deleted}"))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.recommender import Recommender
+
+
+class Command(BaseCommand):
+    help = (
+        "Обрезает множества совместных покупок в Redis до "
+        "RECOMMENDER_MAX_PARTNERS самых частых товаров"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        removed = Recommender().compact(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено элементов: {removed} "
+                f"(не более {settings.RECOMMENDER_MAX_PARTNERS} на товар)"
+            )
+        )
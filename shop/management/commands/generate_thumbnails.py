@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop import thumbnails
+from shop.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Создает уменьшенные JPEG/WebP копии для уже загруженных изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Число процессов (по умолчанию - по числу CPU)"
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Пропускать изображения, для которых копии уже есть",
+        )
+
+    def handle(self, *args, **options):
+        names = set(
+            Product.objects.exclude(image="").values_list("image", flat=True)
+        )
+        names.update(ProductImage.objects.exclude(image="").values_list("image", flat=True))
+        if options["missing_only"]:
+            names = {
+                name
+                for name in names
+                if not thumbnails.has_derivatives(name)
+                or not thumbnails.has_derivatives(name, "webp")
+            }
+        if not names:
+            self.stdout.write("Нет изображений для обработки")
+            return
+
+        # Дочерние процессы не должны наследовать открытые соединения с БД
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(thumbnails.generate_derivatives, name): name
+                for name in sorted(names)
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {e}")
+                if (done + failed) % 100 == 0:
+                    self.stdout.write(f"Обработано {done + failed} из {len(names)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово: {done}, с ошибками: {failed}")
+        )
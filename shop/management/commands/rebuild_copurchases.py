@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from shop.recommender import Recommender
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает совместные покупки товаров в Redis "
+        "по истории оплаченных заказов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--half-life-days",
+            type=float,
+            default=None,
+            help="Период, за который вклад заказа уменьшается вдвое",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        half_life = None
+        if options["half_life_days"]:
+            half_life = timedelta(days=options["half_life_days"])
+        recommender = Recommender()
+        orders = recommender.rebuild_from_orders(
+            half_life=half_life, chunk_size=options["chunk_size"]
+        )
+        # Кэш рекомендаций страниц товаров заполняется заново
+        recommender.rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f"Обработано заказов: {orders}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop import cards
+
+
+class Command(BaseCommand):
+    help = "Перестраивает денормализованные карточки товаров (ProductCard)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = cards.rebuild_cards(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Создано карточек: {count}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс поиска товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stderr.write("Полнотекстовый индекс доступен только для SQLite")
+            return
+        count = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано переводов: {count}"))
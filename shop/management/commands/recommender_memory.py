@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommender import Recommender
+
+
+class Command(BaseCommand):
+    help = "Показывает память Redis рекомендаций по шаблонам ключей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        usage = Recommender().memory_usage(batch_size=options["batch_size"])
+        total = 0
+        for prefix, (keys, size) in sorted(
+            usage.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            total += size
+            self.stdout.write(
+                f"{prefix}: ключей {keys}, {size / 1024:.1f} КБ, "
+                f"в среднем {size / keys:.0f} Б"
+            )
+        self.stdout.write(f"Всего: {total / 1024:.1f} КБ")
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_search USING fts5("
+        "name, description, language_code UNINDEXED, product_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO shop_product_search "
+        "(rowid, name, description, language_code, product_id) "
+        "SELECT id, name, description, language_code, master_id "
+        "FROM shop_product_translation"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS shop_product_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0004_product_weight"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
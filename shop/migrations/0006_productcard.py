@@ -0,0 +1,87 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:09
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from parler.appsettings import PARLER_LANGUAGES
+
+
+def populate_product_cards(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductTranslation = apps.get_model("shop", "ProductTranslation")
+    CategoryTranslation = apps.get_model("shop", "CategoryTranslation")
+    ProductCard = apps.get_model("shop", "ProductCard")
+
+    languages = [code for code, name in settings.LANGUAGES]
+
+    def pick(translations, language):
+        for code in [language, *PARLER_LANGUAGES.get_fallback_languages(language)]:
+            if code in translations:
+                return translations[code]
+        return next(iter(translations.values()))
+
+    product_translations = defaultdict(dict)
+    for translation in ProductTranslation.objects.all():
+        product_translations[translation.master_id][translation.language_code] = translation
+    category_translations = defaultdict(dict)
+    for translation in CategoryTranslation.objects.all():
+        category_translations[translation.master_id][translation.language_code] = translation
+
+    cards = []
+    for product in Product.objects.all():
+        translations = product_translations.get(product.id)
+        if not translations:
+            continue
+        for language in languages:
+            translation = pick(translations, language)
+            category = category_translations.get(product.category_id)
+            cards.append(
+                ProductCard(
+                    product_id=product.id,
+                    language_code=language,
+                    category_id=product.category_id,
+                    category_slug=pick(category, language).slug if category else "",
+                    name=translation.name,
+                    slug=translation.slug,
+                    image=product.image.name,
+                    price=product.price,
+                    weight=product.weight,
+                    available=product.available,
+                    created=product.created,
+                )
+            )
+    ProductCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language_code', models.CharField(max_length=15)),
+                ('category_slug', models.SlugField(max_length=200)),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField(max_length=200)),
+                ('image', models.ImageField(blank=True, max_length=255, upload_to='')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('weight', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('available', models.BooleanField(default=True)),
+                ('created', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_cards', to='shop.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='shop.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['language_code', 'available', '-created', '-product'], name='shop_produc_languag_47cee0_idx'), models.Index(fields=['language_code', 'category', 'available', '-created', '-product'], name='shop_produc_languag_952905_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'language_code'), name='unique_product_card')],
+            },
+        ),
+        migrations.RunPython(populate_product_cards, migrations.RunPython.noop),
+    ]
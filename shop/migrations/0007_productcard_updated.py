@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_product_updated(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductCard = apps.get_model("shop", "ProductCard")
+    ProductCard.objects.update(
+        updated=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("updated")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0006_productcard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productcard",
+            name="updated",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_product_updated, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="productcard",
+            name="updated",
+            field=models.DateTimeField(),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_productcard_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySlugRedirect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language_code', models.CharField(max_length=15)),
+                ('slug', models.SlugField(max_length=200)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slug_redirects', to='shop.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('language_code', 'slug'), name='unique_category_slug_redirect')],
+            },
+        ),
+    ]
@@ -91,3 +91,67 @@ class ProductImage(models.Model):
             return f"Изображение для {self.product.name}"
         except:
             return f"Изображение для товара #{self.product.id}"  # Fallback
+
+
+class CategorySlugRedirect(models.Model):
+    """Прежний slug категории, с которого перенаправляем на новый адрес"""
+
+    language_code = models.CharField(max_length=15)
+    slug = models.SlugField(max_length=200)
+    category = models.ForeignKey(
+        Category, related_name="slug_redirects", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["language_code", "slug"], name="unique_category_slug_redirect"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.slug} ({self.language_code})"
+
+
+class ProductCard(models.Model):
+    """
+    Денормализованная карточка товара для страниц списков: по одной
+    записи на товар и язык, без соединений с таблицами переводов.
+    Обновляется сигналами и командой rebuild_product_cards.
+    """
+
+    product = models.ForeignKey(
+        Product, related_name="cards", on_delete=models.CASCADE
+    )
+    language_code = models.CharField(max_length=15)
+    category = models.ForeignKey(
+        Category, related_name="product_cards", on_delete=models.CASCADE
+    )
+    category_slug = models.SlugField(max_length=200)
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200)
+    image = models.ImageField(max_length=255, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    weight = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    available = models.BooleanField(default=True)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "language_code"], name="unique_product_card"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["language_code", "available", "-created", "-product"]),
+            models.Index(
+                fields=["language_code", "category", "available", "-created", "-product"]
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.language_code})"
+
+    def get_absolute_url(self):
+        return reverse("shop:product_detail", args=[self.product_id, self.slug])
@@ -0,0 +1,195 @@
+"""
+Денежные суммы в целых минимальных единицах валюты (копейках, центах).
+
+Цены товаров хранятся в рублях. Курсы из settings.CURRENCIES один раз
+переводятся в точные дроби, поэтому конвертация и скидки считаются в
+целых числах с округлением половины вверх, без Decimal и повторного
+разбора курсов при каждом вызове.
+"""
+import functools
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+from fractions import Fraction
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import translation
+
+BASE_CURRENCY = "RUB"
+
+Currency = namedtuple(
+    "Currency", "code symbol stripe_currency rate_numerator rate_denominator"
+)
+
+
+def _divide(numerator, denominator):
+    """Целочисленное деление с округлением половины от нуля"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def parse_amount(value):
+    """Число минимальных единиц в строке вида "1200.50" (как цены в корзине)"""
+    if value[-3:-2] == ".":
+        # быстрый путь для цен с двумя знаками после точки
+        return int(value.replace(".", "", 1))
+    return int(Decimal(value).scaleb(2).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class Money:
+    __slots__ = ("amount", "currency")
+
+    def __init__(self, amount, currency=BASE_CURRENCY):
+        self.amount = amount
+        self.currency = currency
+
+    @classmethod
+    def from_decimal(cls, value, currency=BASE_CURRENCY):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value))
+        amount = value.scaleb(2).to_integral_value(rounding=ROUND_HALF_UP)
+        return cls(int(amount), currency)
+
+    @classmethod
+    def parse(cls, value, currency=BASE_CURRENCY):
+        return cls(parse_amount(value), currency)
+
+    def to_decimal(self):
+        return Decimal(self.amount).scaleb(-2)
+
+    def _check(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Разные валюты: {self.currency} и {other.currency}")
+        return other
+
+    def __add__(self, other):
+        if isinstance(other, int) and other == 0:
+            # для sum() без начального значения
+            return self
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.amount + other.amount, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return Money(self.amount - other.amount, self.currency)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int):
+            return NotImplemented
+        return Money(self.amount * quantity, self.currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.amount, self.currency)
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return (self.amount, self.currency) == (other.amount, other.currency)
+
+    def __hash__(self):
+        return hash((self.amount, self.currency))
+
+    def __lt__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return self.amount < other.amount
+
+    def __le__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return self.amount <= other.amount
+
+    def __gt__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return self.amount > other.amount
+
+    def __ge__(self, other):
+        if self._check(other) is NotImplemented:
+            return NotImplemented
+        return self.amount >= other.amount
+
+    def __bool__(self):
+        return bool(self.amount)
+
+    def percent(self, percent):
+        """percent процентов от суммы (скидка)"""
+        return Money(_divide(self.amount * percent, 100), self.currency)
+
+    def convert(self, currency):
+        """Сумма в рублях, пересчитанная в валюту currency (Currency)"""
+        if currency.code == self.currency:
+            return self
+        if self.currency != BASE_CURRENCY:
+            # курсы заданы только относительно рубля
+            raise ValueError(f"Пересчет из {self.currency} в {currency.code} невозможен")
+        return Money(
+            _divide(
+                self.amount * currency.rate_numerator, currency.rate_denominator
+            ),
+            currency.code,
+        )
+
+    def format(self):
+        units, cents = divmod(abs(self.amount), 100)
+        sign = "-" if self.amount < 0 else ""
+        symbol = get_currency_by_code(self.currency).symbol
+        if self.currency == "RUB":
+            return f"{sign}{units:,}".replace(",", " ") + f",{cents:02d} {symbol}"
+        return f"{sign}{symbol}{units:,}.{cents:02d}"
+
+    __str__ = format
+
+    def __repr__(self):
+        return f"Money({self.amount}, {self.currency!r})"
+
+
+@functools.cache
+def _currencies():
+    currencies = {}
+    for language, info in settings.CURRENCIES.items():
+        # float из настроек переводится в точную дробь один раз
+        rate = Fraction(str(info["rate"]))
+        currencies[language] = Currency(
+            info["code"],
+            info["symbol"],
+            info["stripe_currency"],
+            rate.numerator,
+            rate.denominator,
+        )
+    return currencies
+
+
+@functools.cache
+def _currencies_by_code():
+    by_code = {currency.code: currency for currency in _currencies().values()}
+    by_code.setdefault(BASE_CURRENCY, Currency(BASE_CURRENCY, "₽", "rub", 1, 1))
+    return by_code
+
+
+@receiver(setting_changed)
+def reset_currencies(*, setting, **kwargs):
+    if setting == "CURRENCIES":
+        _currencies.cache_clear()
+        _currencies_by_code.cache_clear()
+
+
+def get_currency(language=None):
+    """Валюта для языка (по умолчанию - текущего)"""
+    currencies = _currencies()
+    return currencies.get(language or translation.get_language(), currencies["en"])
+
+
+def get_currency_by_code(code):
+    return _currencies_by_code()[code]
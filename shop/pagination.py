@@ -0,0 +1,107 @@
+"""
+Постраничный вывод по ключу (keyset pagination).
+
+Вместо OFFSET страница выбирается условием по паре (created, id) от
+курсора, поэтому любая страница стоит столько же, сколько первая, и
+использует индекс по -created (id в SQLite входит в индекс как rowid).
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(obj, fields):
+    created_field, id_field = fields
+    created = getattr(obj, created_field).isoformat()
+    value = f"{created}|{getattr(obj, id_field)}".encode()
+    return base64.urlsafe_b64encode(value).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Возвращает (created, id) или None, если курсор поврежден"""
+    if not cursor:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        value = base64.urlsafe_b64decode(cursor + padding).decode()
+        created, id = value.rsplit("|", 1)
+        return datetime.fromisoformat(created), int(id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+def decode_cursors(after, before):
+    """
+    Курсоры из параметров after и before в виде (created, id) или None.
+    before учитывается, только если нет after
+    """
+    after = decode_cursor(after)
+    return after, decode_cursor(before) if after is None else None
+
+
+def paginate(queryset, per_page, after=None, before=None, fields=("created", "id")):
+    """
+    Возвращает страницу queryset, упорядоченного по убыванию fields.
+    after - курсор последнего товара предыдущей страницы (вперед),
+    before - курсор первого товара следующей страницы (назад), оба в виде
+    (created, id) из decode_cursors.
+    """
+    created_field, id_field = fields
+
+    if before is not None:
+        created, id = before
+        queryset = queryset.filter(
+            Q(**{f"{created_field}__gt": created})
+            | Q(**{created_field: created, f"{id_field}__gt": id})
+        ).order_by(created_field, id_field)
+        objects = list(queryset[: per_page + 1])
+        has_previous = len(objects) > per_page
+        objects = objects[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            created, id = after
+            queryset = queryset.filter(
+                Q(**{f"{created_field}__lt": created})
+                | Q(**{created_field: created, f"{id_field}__lt": id})
+            )
+        queryset = queryset.order_by(f"-{created_field}", f"-{id_field}")
+        objects = list(queryset[: per_page + 1])
+        has_next = len(objects) > per_page
+        objects = objects[:per_page]
+        has_previous = after is not None
+
+    if not objects:
+        return KeysetPage(objects)
+    return KeysetPage(
+        objects,
+        next_cursor=encode_cursor(objects[-1], fields) if has_next else None,
+        previous_cursor=encode_cursor(objects[0], fields) if has_previous else None,
+    )
@@ -1,68 +1,269 @@
-import redis
+import logging
+from collections import defaultdict, deque
+from itertools import groupby
+
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone, translation
+from orders.models import OrderItem
+
+from . import cache as catalog_cache
+from .breaker import CircuitBreaker
+from .cards import get_languages
+from .models import Product, ProductCard
+from .recommender_backends import get_backend
+
+logger = logging.getLogger(__name__)
 
-from .models import Product
 
-# Подключаемся к Redis
-r = redis.Redis(
-    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB
+def copurchase_matrix(rows, half_life=None, now=None):
+    """
+    Строит разреженную матрицу совместных покупок {id: {id: балл}}.
+    rows - строки (id заказа, дата заказа, id товара), упорядоченные по
+    заказу. При заданном half_life (timedelta) вклад заказа уменьшается
+    вдвое за каждый период half_life
+    """
+    now = now or timezone.now()
+    matrix = defaultdict(lambda: defaultdict(float))
+    orders = 0
+    for _, order_rows in groupby(rows, key=lambda row: row[0]):
+        order_rows = list(order_rows)
+        product_ids = {row[2] for row in order_rows}
+        orders += 1
+        if len(product_ids) < 2:
+            # заказ из одного товара не дает пар
+            continue
+        weight = 1
+        if half_life:
+            weight = 0.5 ** ((now - order_rows[0][1]) / half_life)
+        for product_id in product_ids:
+            scores = matrix[product_id]
+            for with_id in product_ids:
+                if product_id != with_id:
+                    scores[with_id] += weight
+    return matrix, orders
+
+
+default_breaker = CircuitBreaker(
+    settings.RECOMMENDER_FAILURE_THRESHOLD, settings.RECOMMENDER_RESET_TIMEOUT
 )
+# Заказы, которые не удалось учесть из-за недоступности хранилища
+pending_purchases = deque(maxlen=settings.RECOMMENDER_BUFFER_SIZE)
+
+UNAVAILABLE = object()
 
 
 class Recommender:
-    def get_product_key(self, id):
-        return f"product:{id}:purchased_with"
+    def __init__(self, backend=None, breaker=None, pending=None):
+        self.backend = backend or get_backend()
+        self.breaker = breaker or default_breaker
+        self.pending = pending if pending is not None else pending_purchases
+
+    def _call(self, method, *args, **kwargs):
+        """
+        Вызывает метод хранилища через предохранитель. Возвращает
+        UNAVAILABLE, если хранилище недоступно
+        """
+        if not self.breaker.allow():
+            return UNAVAILABLE
+        try:
+            result = method(*args, **kwargs)
+        except self.backend.errors:
+            logger.warning("Хранилище рекомендаций недоступно", exc_info=True)
+            self.breaker.record_failure()
+            return UNAVAILABLE
+        self.breaker.record_success()
+        return result
 
     def products_bought(self, products):
         product_ids = [p.id for p in products]
-        print(f"🔄 Обновление рекомендаций для товаров: {product_ids}")
+        if not product_ids:
+            return
+        if not self._add_purchases(product_ids):
+            if len(self.pending) == self.pending.maxlen:
+                logger.error(
+                    "Буфер рекомендаций переполнен, потерян заказ: %s",
+                    self.pending[0],
+                )
+            # заказ будет учтен, когда хранилище снова станет доступно
+            self.pending.append(product_ids)
+            return
+        self.replay_pending()
 
-        for product_id in product_ids:
-            for with_id in product_ids:
-                if product_id != with_id:
-                    # увеличьте балл за продукт, приобретенный вместе
-                    key = self.get_product_key(product_id)
-                    r.zincrby(key, 1, with_id)
-                    print(f"   📈 Увеличена связь: {product_id} -> {with_id}")
+    def _add_purchases(self, product_ids):
+        top = self._call(
+            self.backend.add_purchases,
+            product_ids,
+            max_partners=settings.RECOMMENDER_MAX_PARTNERS,
+            top_k=settings.RECOMMENDATIONS_TOP_K,
+        )
+        if top is UNAVAILABLE:
+            return False
 
-        print("✅ Рекомендации обновлены!")
+        catalog_cache.bump_version(
+            *[catalog_cache.recommendations_scope(id) for id in product_ids]
+        )
+        self.cache_recommendations(dict(zip(product_ids, top)))
+        logger.info("Обновлены рекомендации для товаров: %s", product_ids)
+        return True
 
-    def suggest_products_for(self, products, max_results=6):
-        product_ids = [p.id for p in products]
-        print(f"🔍 Поиск рекомендаций для товаров: {product_ids}")
+    def replay_pending(self):
+        """Учитывает заказы, накопленные во время недоступности хранилища"""
+        while self.pending:
+            try:
+                product_ids = self.pending.popleft()
+            except IndexError:
+                break
+            if not self._add_purchases(product_ids):
+                self.pending.appendleft(product_ids)
+                break
 
-        if len(products) == 1:
-            # Только 1 товар
-            key = self.get_product_key(product_ids[0])
-            suggestions = r.zrange(key, 0, -1, desc=True)[:max_results]
-            print(f"   Найдено рекомендаций для {product_ids[0]}: {suggestions}")
-        else:
-            # сгенерировать временный ключ
-            flat_ids = "".join([str(id) for id in product_ids])
-            tmp_key = f"tmp_{flat_ids}"
+    def _recommendations_parts(self, language, product_id, versions):
+        return ("recommendations", language, product_id) + tuple(versions)
 
-            # если несколько товаров объединить баллы всех товаров
-            keys = [self.get_product_key(id) for id in product_ids]
-            r.zunionstore(tmp_key, keys)
+    def _last_recommendations_key(self, language, product_id):
+        # последние известные рекомендации, отдаются при недоступности хранилища
+        return catalog_cache.make_key("recommendations-last", language, product_id)
 
-            # удалить идентификаторы товаров для которых дается рекомендация
-            r.zrem(tmp_key, *product_ids)
+    def cache_recommendations(self, top_ids):
+        """
+        Сохраняет в кэше карточки рекомендаций на всех языках.
+        top_ids - словарь {id товара: id рекомендуемых товаров по порядку}
+        """
+        product_ids = list(top_ids)
+        # Версии читаются до карточек: если товары изменятся в это время,
+        # записи окажутся под устаревшими версиями и не будут использованы
+        all_version, *versions = catalog_cache.get_versions(
+            catalog_cache.ALL_PRODUCTS,
+            *[catalog_cache.recommendations_scope(id) for id in product_ids],
+        )
+        cards = {
+            (card.language_code, card.product_id): card
+            for card in ProductCard.objects.filter(
+                product_id__in={id for ids in top_ids.values() for id in ids}
+            )
+        }
+        entries = {}
+        last_entries = {}
+        for product_id, version in zip(product_ids, versions):
+            for language in get_languages():
+                parts = self._recommendations_parts(
+                    language, product_id, (version, all_version)
+                )
+                suggestions = [
+                    cards[language, id]
+                    for id in top_ids[product_id]
+                    if (language, id) in cards
+                ]
+                entries[catalog_cache.make_key(*parts)] = suggestions
+                last_key = self._last_recommendations_key(language, product_id)
+                last_entries[last_key] = suggestions
+        catalog_cache.call(cache.set_many, entries, settings.CATALOG_CACHE_TIMEOUT)
+        catalog_cache.call(cache.set_many, last_entries, None)
 
-            # получить предлагаемые товары и отсортировать их по порядку появления
-            suggestions = r.zrange(tmp_key, 0, -1, desc=True)[:max_results]
-            print(f"   Найдено рекомендаций для нескольких товаров: {suggestions}")
+    def cached_suggestions_for(self, product, max_results, versions):
+        """
+        Рекомендации для одного товара из кэша. versions - версии областей
+        recommendations_scope(product.id) и ALL_PRODUCTS
+        """
+        language = translation.get_language()
+        key = catalog_cache.make_key(
+            *self._recommendations_parts(language, product.id, versions)
+        )
+        last_key = self._last_recommendations_key(language, product.id)
+        # при недоступном кэше рекомендации берутся прямо из хранилища
+        suggestions = catalog_cache.call(cache.get, key)
+        if suggestions is None:
+            product_ids = self._call(
+                self.backend.suggest, [product.id], settings.RECOMMENDATIONS_TOP_K
+            )
+            if product_ids is UNAVAILABLE:
+                last = catalog_cache.call(cache.get, last_key, [], default=[])
+                return last[:max_results]
+            suggestions = self._get_cards(product_ids)
+            catalog_cache.call(
+                cache.set, key, suggestions, settings.CATALOG_CACHE_TIMEOUT
+            )
+            catalog_cache.call(cache.set, last_key, suggestions, None)
+        return suggestions[:max_results]
 
-            # Удалить временный ключ
-            r.delete(tmp_key)
+    def rebuild_recommendations(self, batch_size=500):
+        """Пересчитывает кэш рекомендаций всех товаров"""
+        product_ids = list(Product.objects.values_list("id", flat=True))
+        top_k = settings.RECOMMENDATIONS_TOP_K
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start : start + batch_size]
+            top = self.backend.top(batch, top_k)
+            self.cache_recommendations(dict(zip(batch, top)))
+        return len(product_ids)
 
-        suggested_product_ids = [int(id) for id in suggestions]
+    def suggest_products_for(self, products, max_results=6):
+        product_ids = [p.id for p in products]
 
-        # Получить предлагаемые товары и отсортировать их по порядку появления
-        suggested_products = list(Product.objects.filter(id__in=suggested_product_ids))
-        suggested_products.sort(key=lambda x: suggested_product_ids.index(x.id))
+        suggested_product_ids = self._call(
+            self.backend.suggest, product_ids, max_results
+        )
+        if suggested_product_ids is UNAVAILABLE:
+            # без рекомендаций страница продолжает работать
+            return []
+        logger.debug(
+            "Рекомендации для товаров %s: %s", product_ids, suggested_product_ids
+        )
+        return self._get_cards(suggested_product_ids)
+
+    def _get_cards(self, product_ids):
+        # Получить карточки предлагаемых товаров и отсортировать их по порядку появления
+        suggested_products = list(
+            ProductCard.objects.filter(
+                product_id__in=product_ids,
+                language_code=translation.get_language(),
+            )
+        )
+        suggested_products.sort(key=lambda x: product_ids.index(x.product_id))
 
         return suggested_products
 
-    def clear_puchases(self):
-        for id in Product.objects.values_list("id", flat=True):
-            r.delete(self.get_product_key(id))
+    def rebuild_from_orders(self, half_life=None, chunk_size=2000):
+        """
+        Пересчитывает совместные покупки по позициям оплаченных заказов,
+        возвращает число заказов
+        """
+        rows = (
+            OrderItem.objects.filter(order__paid=True)
+            .order_by("order_id")
+            .values_list("order_id", "order__created", "product_id")
+            .iterator(chunk_size=chunk_size)
+        )
+        matrix, orders = copurchase_matrix(rows, half_life)
+        self.backend.replace_all(
+            matrix, settings.RECOMMENDER_MAX_PARTNERS, chunk_size=chunk_size
+        )
+
+        logger.info(
+            "Совместные покупки пересчитаны: заказов %s, товаров %s",
+            orders,
+            len(matrix),
+        )
+        return orders
+
+    def compact(self, batch_size=500):
+        """
+        Обрезает существующие множества до RECOMMENDER_MAX_PARTNERS
+        элементов, возвращает число удаленных элементов
+        """
+        return self.backend.compact(settings.RECOMMENDER_MAX_PARTNERS, batch_size)
+
+    def memory_usage(self, batch_size=500):
+        """
+        Память хранилища по шаблонам ключей: {шаблон: (число ключей, байт)}
+        """
+        return self.backend.memory_usage(batch_size)
+
+    def clear_puchases(self, batch_size=500, pause=0, progress=None):
+        """
+        Удаляет все данные о совместных покупках, включая данные удаленных
+        товаров. progress вызывается после каждой пачки с числом удаленных
+        ключей, pause - пауза между пачками в секундах. Возвращает число
+        ключей
+        """
+        return self.backend.clear(batch_size, pause=pause, progress=progress)
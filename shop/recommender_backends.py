@@ -0,0 +1,364 @@
+"""
+Хранилища совместных покупок для Recommender.
+
+RedisBackend хранит для каждого товара отсортированное множество
+product:<id>:purchased_with. InProcessBackend держит те же данные в памяти
+процесса и нужен для разработки и тестов без сервера Redis. Хранилище
+выбирается настройкой RECOMMENDER_BACKEND.
+"""
+import functools
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .redis_client import get_redis
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# id товаров, а также hex и uuid (например, ключи корзин cart:<uuid hex>)
+KEY_ID_PATTERN = re.compile(
+    r"(?<=:)(?:-?\d+|[0-9a-f]{32}|[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12})(?=:|$)"
+)
+
+
+def key_prefix(key):
+    """Шаблон ключа, в котором идентификаторы заменены на *"""
+    return KEY_ID_PATTERN.sub("*", key)
+
+
+@functools.cache
+def get_backend():
+    """Хранилище, общее для всего процесса"""
+    return import_string(settings.RECOMMENDER_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_backend(*, setting, **kwargs):
+    # хранилище держит клиент Redis, созданный по настройкам REDIS_*
+    if setting == "RECOMMENDER_BACKEND" or setting.startswith("REDIS_"):
+        get_backend.cache_clear()
+
+
+class BaseBackend:
+    """
+    Идентификаторы товаров передаются и возвращаются числами, списки
+    рекомендаций упорядочены по убыванию балла, при равенстве - по
+    убыванию идентификатора (как у ZREVRANGE)
+    """
+
+    # Исключения, означающие недоступность хранилища
+    errors = ()
+
+    def add_purchases(self, product_ids, max_partners, top_k):
+        """
+        Учитывает заказ: увеличивает баллы каждой пары товаров, обрезает
+        множества до max_partners и возвращает top_k лучших рекомендаций
+        для каждого товара
+        """
+        raise NotImplementedError
+
+    def top(self, product_ids, n):
+        """Лучшие n рекомендаций для каждого товара"""
+        raise NotImplementedError
+
+    def suggest(self, product_ids, n):
+        """Лучшие n товаров по сумме баллов, кроме самих product_ids"""
+        raise NotImplementedError
+
+    def scores(self, product_id):
+        """Все пары (товар, балл) по убыванию балла"""
+        raise NotImplementedError
+
+    def replace_all(self, matrix, max_partners, chunk_size):
+        """Заменяет все данные матрицей {id: {id: балл}}"""
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def compact(self, max_partners, batch_size):
+        """Обрезает множества до max_partners, возвращает число удаленных"""
+        raise NotImplementedError
+
+    def memory_usage(self, batch_size):
+        """Занятая память: {шаблон ключа: (число ключей, байт)}"""
+        raise NotImplementedError
+
+    def clear(self, batch_size, pause=0, progress=None):
+        """Удаляет все данные, возвращает число удаленных множеств"""
+        raise NotImplementedError
+
+
+# Суммирует баллы из KEYS, исключает товары из ARGV[2..] и возвращает
+# ARGV[1] лучших идентификаторов. Порядок совпадает с ZUNIONSTORE + ZREVRANGE:
+# по убыванию балла, при равенстве - по убыванию идентификатора
+SUGGEST_FOR_MANY = """
+local scores = {}
+for _, key in ipairs(KEYS) do
+    local items = redis.call('ZRANGE', key, 0, -1, 'WITHSCORES')
+    for i = 1, #items, 2 do
+        scores[items[i]] = (scores[items[i]] or 0) + tonumber(items[i + 1])
+    end
+end
+for i = 2, #ARGV do
+    scores[ARGV[i]] = nil
+end
+local ranked = {}
+for member, score in pairs(scores) do
+    ranked[#ranked + 1] = {member, score}
+end
+table.sort(ranked, function(a, b)
+    if a[2] ~= b[2] then
+        return a[2] > b[2]
+    end
+    return a[1] > b[1]
+end)
+local result = {}
+for i = 1, math.min(tonumber(ARGV[1]), #ranked) do
+    result[i] = ranked[i][1]
+end
+return result
+"""
+
+
+class RedisBackend(BaseBackend):
+    errors = (redis.RedisError,)
+
+    def __init__(self):
+        # Пул соединений общий с корзинами
+        self.client = get_redis()
+        self.suggest_for_many = self.client.register_script(SUGGEST_FOR_MANY)
+
+    def get_product_key(self, id):
+        return f"product:{id}:purchased_with"
+
+    def _staging_key(self, product_id):
+        return f"{self.get_product_key(product_id)}:rebuild"
+
+    def add_purchases(self, product_ids, max_partners, top_k):
+        # Все увеличения баллов отправляются одним пакетом MULTI/EXEC:
+        # один сетевой обмен независимо от размера заказа
+        with self.client.pipeline(transaction=True) as pipe:
+            for product_id in product_ids:
+                key = self.get_product_key(product_id)
+                for with_id in product_ids:
+                    if product_id != with_id:
+                        # увеличьте балл за продукт, приобретенный вместе
+                        pipe.zincrby(key, 1, with_id)
+                # оставляем только самые частые совместные покупки
+                pipe.zremrangebyrank(key, 0, -max_partners - 1)
+            # в том же обмене читаем обновленные лучшие рекомендации
+            for product_id in product_ids:
+                pipe.zrevrange(self.get_product_key(product_id), 0, top_k - 1)
+            top = pipe.execute()[-len(product_ids) :]
+        return [[int(id) for id in ids] for ids in top]
+
+    def top(self, product_ids, n):
+        with self.client.pipeline(transaction=False) as pipe:
+            for product_id in product_ids:
+                pipe.zrevrange(self.get_product_key(product_id), 0, n - 1)
+            return [[int(id) for id in ids] for ids in pipe.execute()]
+
+    def suggest(self, product_ids, n):
+        if len(product_ids) == 1:
+            # Только 1 товар: сервер отдает сразу первые n
+            suggestions = self.client.zrevrange(
+                self.get_product_key(product_ids[0]), 0, n - 1
+            )
+        else:
+            # если несколько товаров объединить баллы всех товаров на сервере,
+            # без временного ключа и за один сетевой обмен
+            keys = [self.get_product_key(id) for id in product_ids]
+            suggestions = self.suggest_for_many(keys=keys, args=[n, *product_ids])
+        return [int(id) for id in suggestions]
+
+    def scores(self, product_id):
+        items = self.client.zrevrange(
+            self.get_product_key(product_id), 0, -1, withscores=True
+        )
+        return [(int(id), score) for id, score in items]
+
+    def replace_all(self, matrix, max_partners, chunk_size):
+        # Новые множества записываются во временные ключи и затем
+        # переименовываются, до этого рекомендации работают по старым данным
+        with self.client.pipeline(transaction=False) as pipe:
+            for product_id, scores in matrix.items():
+                staging_key = self._staging_key(product_id)
+                # остатки прерванной перестройки
+                pipe.delete(staging_key)
+                items = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+                items = items[:max_partners]
+                for start in range(0, len(items), chunk_size):
+                    pipe.zadd(staging_key, dict(items[start : start + chunk_size]))
+                if len(pipe) >= chunk_size:
+                    pipe.execute()
+            pipe.execute()
+
+            for product_id, scores in matrix.items():
+                key = self.get_product_key(product_id)
+                if scores:
+                    pipe.rename(self._staging_key(product_id), key)
+                else:
+                    # пустое множество не создает временный ключ
+                    pipe.unlink(key)
+                if len(pipe) >= chunk_size:
+                    pipe.execute()
+            pipe.execute()
+
+            # товары без истории покупок, в том числе удаленные
+            live_keys = self.client.scan_iter(
+                match=self.get_product_key("*"), count=chunk_size
+            )
+            for batch in batched(live_keys, chunk_size):
+                stale = [key for key in batch if int(key.split(b":")[1]) not in matrix]
+                if stale:
+                    self.client.unlink(*stale)
+
+    def remove(self, product_ids):
+        if product_ids:
+            self.client.unlink(*[self.get_product_key(id) for id in product_ids])
+
+    def compact(self, max_partners, batch_size):
+        removed = 0
+        keys = self.client.scan_iter(match=self.get_product_key("*"), count=batch_size)
+        for batch in batched(keys, batch_size):
+            with self.client.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.zremrangebyrank(key, 0, -max_partners - 1)
+                removed += sum(pipe.execute())
+        return removed
+
+    def memory_usage(self, batch_size):
+        usage = defaultdict(lambda: [0, 0])
+        for batch in batched(self.client.scan_iter(count=batch_size), batch_size):
+            with self.client.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.memory_usage(key)
+                sizes = pipe.execute()
+            for key, size in zip(batch, sizes):
+                # ключ мог быть удален между SCAN и MEMORY USAGE
+                if size is None:
+                    continue
+                prefix = usage[key_prefix(key.decode())]
+                prefix[0] += 1
+                prefix[1] += size
+        return {prefix: tuple(value) for prefix, value in usage.items()}
+
+    def clear(self, batch_size, pause=0, progress=None):
+        # Ключи перебираются SCAN и удаляются пачками через UNLINK
+        # (память освобождается в фоне), поэтому Redis не блокируется
+        deleted = 0
+        keys = self.client.scan_iter(
+            match=f"{self.get_product_key('*')}*", count=batch_size
+        )
+        for batch in batched(keys, batch_size):
+            deleted += self.client.unlink(*batch)
+            if progress:
+                progress(deleted)
+            if pause:
+                time.sleep(pause)
+        return deleted
+
+
+class InProcessBackend(BaseBackend):
+    """Данные в памяти процесса: {id товара: {id товара: балл}}"""
+
+    def __init__(self):
+        self.data = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def _ranked(self, scores, n=None):
+        ranked = sorted(
+            scores.items(), key=lambda item: (item[1], str(item[0])), reverse=True
+        )
+        return ranked if n is None else ranked[:n]
+
+    def _trim(self, product_id, max_partners):
+        scores = self.data[product_id]
+        removed = len(scores) - max_partners
+        if removed > 0:
+            self.data[product_id] = dict(self._ranked(scores, max_partners))
+            return removed
+        return 0
+
+    def add_purchases(self, product_ids, max_partners, top_k):
+        with self.lock:
+            for product_id in product_ids:
+                scores = self.data[product_id]
+                for with_id in product_ids:
+                    if product_id != with_id:
+                        scores[with_id] = scores.get(with_id, 0) + 1
+                self._trim(product_id, max_partners)
+            return [
+                [id for id, score in self._ranked(self.data[product_id], top_k)]
+                for product_id in product_ids
+            ]
+
+    def top(self, product_ids, n):
+        with self.lock:
+            return [
+                [id for id, score in self._ranked(self.data.get(product_id, {}), n)]
+                for product_id in product_ids
+            ]
+
+    def suggest(self, product_ids, n):
+        totals = defaultdict(float)
+        with self.lock:
+            for product_id in product_ids:
+                for with_id, score in self.data.get(product_id, {}).items():
+                    totals[with_id] += score
+        for product_id in product_ids:
+            totals.pop(product_id, None)
+        return [id for id, score in self._ranked(totals, n)]
+
+    def scores(self, product_id):
+        with self.lock:
+            return self._ranked(self.data.get(product_id, {}))
+
+    def replace_all(self, matrix, max_partners, chunk_size):
+        data = defaultdict(dict)
+        for product_id, scores in matrix.items():
+            data[product_id] = dict(self._ranked(scores, max_partners))
+        with self.lock:
+            self.data = data
+
+    def remove(self, product_ids):
+        with self.lock:
+            for product_id in product_ids:
+                self.data.pop(product_id, None)
+
+    def compact(self, max_partners, batch_size):
+        with self.lock:
+            return sum(self._trim(id, max_partners) for id in list(self.data))
+
+    def memory_usage(self, batch_size):
+        with self.lock:
+            size = sum(
+                sys.getsizeof(scores) + sys.getsizeof(product_id)
+                for product_id, scores in self.data.items()
+            )
+        if not self.data:
+            return {}
+        return {"product:*:purchased_with": (len(self.data), size)}
+
+    def clear(self, batch_size, pause=0, progress=None):
+        with self.lock:
+            deleted = len(self.data)
+            self.data = defaultdict(dict)
+        if progress:
+            progress(deleted)
+        return deleted
@@ -0,0 +1,33 @@
+"""
+Клиент Redis, общий для процесса.
+
+Рекомендации и корзины используют один пул соединений с общими
+ограничениями и таймаутами из настроек REDIS_*.
+"""
+import functools
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+@functools.cache
+def get_redis():
+    # Без таймаутов зависший Redis блокировал бы обработку запросов
+    return redis.Redis(
+        connection_pool=redis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        )
+    )
+
+
+@receiver(setting_changed)
+def reset_redis(*, setting, **kwargs):
+    if setting.startswith("REDIS_"):
+        get_redis.cache_clear()
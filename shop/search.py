@@ -0,0 +1,163 @@
+"""
+Полнотекстовый поиск по переводам товаров.
+
+Переводы индексируются в виртуальной таблице SQLite FTS5 (rowid = id
+перевода), поэтому поиск не сканирует таблицу переводов через LIKE,
+а ранжирует совпадения через bm25. Для других СУБД search_product_ids()
+возвращает None и представление использует обычный icontains-поиск.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from parler.appsettings import PARLER_LANGUAGES
+
+from .models import Product
+
+SEARCH_TABLE = "shop_product_search"
+
+# Вес совпадений в названии и в описании для bm25
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Окончания, которые отбрасываются у слов запроса (от длинных к коротким).
+# Оставшаяся основа ищется как префикс, поэтому "питоны" находит "питон",
+# а "serpientes" - "serpiente".
+SUFFIXES = {
+    "ru": (
+        "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими",
+        "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ам",
+        "ям", "ах", "ях", "ов", "ев", "ом", "ем", "ью",
+        "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+    ),
+    "es": (
+        "amente", "mente", "ciones", "cion", "ción", "es", "os", "as",
+        "s", "a", "o", "e",
+    ),
+    "en": ("ies", "es", "s"),
+}
+MIN_STEM_LENGTH = 3
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported():
+    return connection.vendor == "sqlite"
+
+
+def index_translation(translation):
+    """Добавляет или обновляет перевод товара в поисковом индексе"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [translation.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} "
+            "(rowid, name, description, language_code, product_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [
+                translation.pk,
+                translation.name,
+                translation.description,
+                translation.language_code,
+                translation.master_id,
+            ],
+        )
+
+
+def remove_translation(translation_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [translation_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Полностью перестраивает индекс, возвращает число переводов"""
+    if not is_supported():
+        return 0
+    translations = (
+        Product._parler_meta.root_model.objects.order_by()
+        .values_list("pk", "name", "description", "language_code", "master_id")
+        .iterator(chunk_size=batch_size)
+    )
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        batch = []
+        for row in translations:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_rows(cursor, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _insert_rows(cursor, batch)
+            count += len(batch)
+    return count
+
+
+def _insert_rows(cursor, rows):
+    cursor.executemany(
+        f"INSERT INTO {SEARCH_TABLE} "
+        "(rowid, name, description, language_code, product_id) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        rows,
+    )
+
+
+def stem(word, language):
+    for suffix in SUFFIXES.get(language, ()):
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[: -len(suffix)]
+    return word
+
+
+def build_match_query(query, language):
+    """
+    Превращает пользовательский запрос в выражение FTS5: каждое слово
+    приводится к основе и ищется как префикс, все слова должны совпасть.
+    """
+    terms = []
+    for word in WORD_RE.findall(query.lower()):
+        word = stem(word, language).replace('"', "")
+        if word:
+            terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def search_product_ids(query, language, limit=None):
+    """
+    Возвращает id товаров по убыванию релевантности. Ищет на текущем
+    языке и на резервных языках parler. Возвращает None, если
+    полнотекстовый индекс не поддерживается базой данных.
+    """
+    if not is_supported():
+        return None
+    match = build_match_query(query, language)
+    if not match:
+        return []
+    if limit is None:
+        limit = settings.SEARCH_RESULTS_LIMIT
+    languages = [language] + [
+        code
+        for code in PARLER_LANGUAGES.get_fallback_languages(language)
+        if code != language
+    ]
+    placeholders = ", ".join(["%s"] * len(languages))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT product_id FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND language_code IN ({placeholders}) "
+            f"ORDER BY bm25({SEARCH_TABLE}, %s, %s) LIMIT %s",
+            [match, *languages, NAME_WEIGHT, DESCRIPTION_WEIGHT, limit * len(languages)],
+        )
+        rows = cursor.fetchall()
+
+    product_ids = []
+    seen = set()
+    for (product_id,) in rows:
+        if product_id not in seen:
+            seen.add(product_id)
+            product_ids.append(product_id)
+    return product_ids[:limit]
@@ -0,0 +1,52 @@
+"""
+Расчет стоимости доставки по весу.
+
+Таблицы тарифов из settings.SHIPPING_RATES разбираются один раз, ступень
+находится двоичным поиском. Корзина и заказ используют один и тот же
+расчет, стоимость возвращается в рублях.
+"""
+import functools
+from bisect import bisect_left
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .money import Money
+
+DEFAULT_ZONE = "default"
+
+RateTable = namedtuple("RateTable", "limits prices per_kg")
+
+
+@functools.cache
+def _rate_tables():
+    tables = {}
+    for zone, rates in settings.SHIPPING_RATES.items():
+        tiers = sorted(rates["tiers"])
+        tables[zone] = RateTable(
+            [Decimal(limit) for limit, price in tiers],
+            [Money.from_decimal(Decimal(price)) for limit, price in tiers],
+            Decimal(rates["per_kg"]),
+        )
+    return tables
+
+
+@receiver(setting_changed)
+def reset_rate_tables(*, setting, **kwargs):
+    if setting == "SHIPPING_RATES":
+        _rate_tables.cache_clear()
+
+
+def get_shipping_cost(weight, zone=None):
+    """Стоимость доставки (Money в рублях) для веса в граммах"""
+    tables = _rate_tables()
+    table = tables.get(zone or DEFAULT_ZONE, tables[DEFAULT_ZONE])
+    index = bisect_left(table.limits, weight)
+    if index < len(table.limits):
+        return table.prices[index]
+    # свыше последней ступени - доплата за каждый килограмм
+    excess = Decimal(weight) - table.limits[-1]
+    return table.prices[-1] + Money.from_decimal(excess / 1000 * table.per_kg)
@@ -0,0 +1,164 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from . import cards, search, slugs
+from .models import Category, Product, ProductImage
+from .tasks import generate_thumbnails
+
+ProductTranslation = Product._parler_meta.root_model
+CategoryTranslation = Category._parler_meta.root_model
+
+
+@receiver(post_save, sender=ProductTranslation)
+def index_product_translation(sender, instance, **kwargs):
+    """Обновляет поисковый индекс при сохранении перевода товара"""
+    search.index_translation(instance)
+
+
+@receiver(post_delete, sender=ProductTranslation)
+def unindex_product_translation(sender, instance, **kwargs):
+    search.remove_translation(instance.pk)
+
+
+def deleted_with(origin, model):
+    """Удаление вызвано каскадом от объекта (или queryset) модели model"""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_cards(sender, instance, **kwargs):
+    cards.refresh_cards([instance.pk])
+
+
+@receiver(post_save, sender=ProductTranslation)
+@receiver(post_delete, sender=ProductTranslation)
+def refresh_product_translation_cards(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Product) or deleted_with(origin, Category):
+        return
+    cards.refresh_cards([instance.master_id])
+
+
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def refresh_category_cards(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Category):
+        return
+    cards.refresh_category_cards(instance.master_id)
+
+
+def bump_on_commit(*scopes):
+    """
+    Версии меняются после фиксации транзакции (и после обновления
+    карточек выше): иначе запрос, пришедший до фиксации, закэширует
+    старые данные под новой версией
+    """
+    transaction.on_commit(lambda: catalog_cache.bump_version(*scopes))
+
+
+def bump_product_scopes(*category_ids):
+    bump_on_commit(
+        catalog_cache.ALL_PRODUCTS,
+        *[catalog_cache.category_scope(id) for id in category_ids if id],
+    )
+
+
+def product_category_id(product_id):
+    return (
+        Product.objects.filter(pk=product_id)
+        .values_list("category_id", flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    # Товар мог перейти в другую категорию (сбрасываем кэш и старой)
+    # или получить новое изображение (нужны новые уменьшенные копии)
+    if not instance.pk:
+        return
+    previous = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "image")
+        .first()
+    )
+    if previous:
+        instance._previous_category_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    bump_product_scopes(
+        instance.category_id, getattr(instance, "_previous_category_id", None)
+    )
+
+
+@receiver(post_save, sender=ProductTranslation)
+@receiver(post_delete, sender=ProductTranslation)
+def invalidate_product_translation(sender, instance, **kwargs):
+    bump_product_scopes(product_category_id(instance.master_id))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image(sender, instance, **kwargs):
+    bump_product_scopes(product_category_id(instance.product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    bump_on_commit(
+        catalog_cache.CATEGORIES, catalog_cache.category_scope(instance.pk)
+    )
+
+
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def invalidate_category_translation(sender, instance, **kwargs):
+    bump_on_commit(
+        catalog_cache.CATEGORIES, catalog_cache.category_scope(instance.master_id)
+    )
+
+
+def schedule_thumbnails(instance, previous_image):
+    name = instance.image.name
+    if name and name != previous_image:
+        transaction.on_commit(lambda: generate_thumbnails.delay(name))
+
+
+@receiver(pre_save, sender=ProductImage)
+def remember_product_image(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    instance._previous_image = (
+        ProductImage.objects.filter(pk=instance.pk)
+        .values_list("image", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def create_thumbnails(sender, instance, **kwargs):
+    schedule_thumbnails(instance, getattr(instance, "_previous_image", None))
+
+
+@receiver(pre_save, sender=CategoryTranslation)
+def remember_category_slug(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    old_slug = (
+        CategoryTranslation.objects.filter(pk=instance.pk)
+        .values_list("slug", flat=True)
+        .first()
+    )
+    if old_slug and old_slug != instance.slug:
+        slugs.remember_category_slug(
+            instance.language_code, old_slug, instance.slug, instance.master_id
+        )
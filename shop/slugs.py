@@ -0,0 +1,85 @@
+"""
+Кэш соответствия (язык, slug) -> id для маршрутов каталога.
+
+Сначала проверяется LRU-кэш процесса, затем общий кэш Django и только
+потом таблица переводов. Версия категорий входит в ключ, поэтому при
+изменении переводов (сигналы обновляют версию) старые записи перестают
+использоваться. Старые slug'и категорий сохраняются в таблице
+CategorySlugRedirect, чтобы перенаправлять со старых адресов на новые и
+после перезапуска.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import cache as catalog_cache
+from .models import Category, CategorySlugRedirect
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self.lock:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                return default
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+category_ids = LRUCache(settings.SLUG_CACHE_SIZE)
+
+
+def resolve_category_id(language, slug, categories_version):
+    """Возвращает id категории по slug или None"""
+    key = (language, slug, categories_version)
+    category_id = category_ids.get(key)
+    if category_id is MISSING:
+        category_id = catalog_cache.get_or_set(
+            ("category-slug",) + key,
+            lambda: Category._parler_meta.root_model.objects.filter(
+                language_code=language, slug=slug
+            )
+            .values_list("master_id", flat=True)
+            .first(),
+        )
+        category_ids.set(key, category_id)
+    return category_id
+
+
+def resolve_category_redirect(language, slug, categories_version):
+    """id категории, у которой раньше был этот slug, или None"""
+    return catalog_cache.get_or_set(
+        ("category-slug-redirect", language, slug, categories_version),
+        lambda: CategorySlugRedirect.objects.filter(
+            language_code=language, slug=slug
+        )
+        .values_list("category_id", flat=True)
+        .first(),
+    )
+
+
+def remember_category_slug(language, old_slug, new_slug, category_id):
+    CategorySlugRedirect.objects.update_or_create(
+        language_code=language, slug=old_slug, defaults={"category_id": category_id}
+    )
+    # категория вернула себе прежний slug - перенаправление больше не нужно
+    CategorySlugRedirect.objects.filter(language_code=language, slug=new_slug).delete()
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from . import thumbnails
+from .recommender import Recommender
+
+
+@shared_task
+def generate_thumbnails(name):
+    """
+    Задание по созданию уменьшенных JPEG/WebP копий
+    загруженного изображения товара
+    """
+    return thumbnails.generate_derivatives(name)
+
+
+@shared_task
+def rebuild_recommendations():
+    """
+    Периодическое задание по пересчету кэша рекомендаций всех товаров
+    """
+    return Recommender().rebuild_recommendations()
@@ -0,0 +1,33 @@
+from django import template
+from django.templatetags.cache import CacheNode, do_cache
+
+from shop import cache as catalog_cache
+
+register = template.Library()
+
+
+class CatalogCacheNode(CacheNode):
+    def render(self, context):
+        value = catalog_cache.call(
+            super().render, context, default=catalog_cache.MISSING
+        )
+        if value is catalog_cache.MISSING:
+            # кэш недоступен - фрагмент отрисовывается без него
+            value = self.nodelist.render(context)
+        return value
+
+
+@register.tag("cache")
+def do_catalog_cache(parser, token):
+    """
+    Тот же {% cache %}, но ошибка кэша считается промахом (см. shop.cache).
+    Подключается вместо встроенного: {% load catalog_cache_tags %}
+    """
+    node = do_cache(parser, token)
+    return CatalogCacheNode(
+        node.nodelist,
+        node.expire_time_var,
+        node.fragment_name,
+        node.vary_on,
+        node.cache_name,
+    )
@@ -1,8 +1,8 @@
-from decimal import Decimal
+from decimal import InvalidOperation
 
 from django import template
-from django.conf import settings
-from django.utils import translation
+
+from shop.money import Money, get_currency
 
 register = template.Library()
 
@@ -14,28 +14,12 @@ def currency(value):
         return ""
 
     try:
-        current_language = translation.get_language()
-        currency_info = settings.CURRENCIES.get(
-            current_language, settings.CURRENCIES["en"]
-        )
-        
+        if not isinstance(value, Money):
+            value = Money.from_decimal(value)
         # Конвертируем из рублей в целевую валюту
-        decimal_value = Decimal(str(value))
-        decimal_rate = Decimal(str(currency_info["rate"]))
-        converted_price = decimal_value * decimal_rate
-        formatted_price = round(converted_price, 2)
-
-        if currency_info["code"] == "RUB":
-            result = f"{formatted_price:,.2f} {currency_info['symbol']}".replace(
-                ",", " "
-            ).replace(".", ",")
-        elif currency_info["code"] == "EUR":
-            result = f"{currency_info['symbol']}{formatted_price:,.2f}"
-        else:  # USD
-            result = f"{currency_info['symbol']}{formatted_price:,.2f}"
-        return result
+        return value.convert(get_currency()).format()
 
-    except (ValueError, TypeError, KeyError) as e:
+    except (ValueError, TypeError, KeyError, InvalidOperation):
         return f"${value}"
 
 
@@ -46,24 +30,10 @@ def order_currency(value):
         return ""
 
     try:
-        current_language = translation.get_language()
-        currency_info = settings.CURRENCIES.get(
-            current_language, settings.CURRENCIES["en"]
-        )
-        
-        # НЕ конвертируем, только форматируем!
-        decimal_value = Decimal(str(value))
-        formatted_price = round(decimal_value, 2)
+        if not isinstance(value, Money):
+            # НЕ конвертируем, только форматируем в валюте текущего языка
+            value = Money.from_decimal(value, get_currency().code)
+        return value.format()
 
-        if currency_info["code"] == "RUB":
-            result = f"{formatted_price:,.2f} {currency_info['symbol']}".replace(
-                ",", " "
-            ).replace(".", ",")
-        elif currency_info["code"] == "EUR":
-            result = f"{currency_info['symbol']}{formatted_price:,.2f}"
-        else:  # USD
-            result = f"{currency_info['symbol']}{formatted_price:,.2f}"
-        return result
-
-    except (ValueError, TypeError, KeyError) as e:
-        return f"${value}"
\ No newline at end of file
+    except (ValueError, TypeError, KeyError, InvalidOperation):
+        return f"${value}"
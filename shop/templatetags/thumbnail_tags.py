@@ -0,0 +1,21 @@
+from django import template
+from shop import thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(image, size):
+    """URL уменьшенной копии: {{ product.image|thumbnail:"medium" }}"""
+    return thumbnails.thumbnail_url(image, size)
+
+
+@register.filter
+def webp_thumbnail(image, size):
+    return thumbnails.thumbnail_url(image, size, "webp")
+
+
+@register.filter
+def srcset(image, format="jpeg"):
+    """Значение srcset: {{ product.image|srcset:"webp" }}"""
+    return thumbnails.srcset(image, format)
@@ -0,0 +1,33 @@
+"""
+Общие настройки тестов приложений.
+
+Модули тестов импортируют отсюда setUpModule: тесты не очищают и не
+заполняют общий кэш в Redis, а используют LocMemCache.
+"""
+from unittest import addModuleCleanup
+
+import redis
+from django.test import override_settings
+
+from .redis_client import get_redis
+
+# Отдельная база Redis: тесты удаляют ключи и не должны трогать данные
+# REDIS_DB приложения
+REDIS_TEST_DB = 15
+
+LOCAL_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def setUpModule():
+    settings_override = override_settings(CACHES=LOCAL_CACHES)
+    settings_override.enable()
+    addModuleCleanup(settings_override.disable)
+
+
+def redis_available():
+    try:
+        return get_redis().ping()
+    except redis.RedisError:
+        return False
@@ -1,3 +1,687 @@
-from django.test import TestCase
+import uuid
+from collections import deque
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+from redis.connection import Connection
+
+from orders.models import Order, OrderItem
+
+from . import cache as catalog_cache
+from . import slugs
+from .checks import check_shared_cache
+from .models import Category, CategorySlugRedirect, Product
+from .money import Money, get_currency
+from .shipping import get_shipping_cost
+from .recommender import CircuitBreaker, Recommender
+from .recommender_backends import InProcessBackend, key_prefix
+from .testing import REDIS_TEST_DB, redis_available, setUpModule  # noqa: F401
+
+IN_PROCESS_BACKEND = "shop.recommender_backends.InProcessBackend"
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_warns_about_per_process_cache(self):
+        # модуль тестов подменяет кэш на LocMemCache
+        warnings = check_shared_cache(None)
+        self.assertEqual([warning.id for warning in warnings], ["shop.W001"])
+        redis_cache = {"BACKEND": "django.core.cache.backends.redis.RedisCache"}
+        with override_settings(CACHES={"default": redis_cache}):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class MoneyTests(TestCase):
+    def test_parse_and_convert(self):
+        self.assertEqual(Money.parse("1200.5"), Money(120050))
+        self.assertEqual(Money.parse("-0.05"), Money(-5))
+        self.assertEqual(Money.parse("10.005"), Money(1001))
+        self.assertEqual(Money.from_decimal(Decimal("999.99")), Money(99999))
+        # 1234.56 ₽ * 0.012 = 14.81472 $
+        usd = Money(123456).convert(get_currency("en"))
+        self.assertEqual(usd, Money(1481, "USD"))
+        self.assertEqual(Money(50).convert(get_currency("es")), Money(1, "EUR"))
+        self.assertEqual(usd.convert(get_currency("en")), usd)
+        with self.assertRaises(ValueError):
+            usd.convert(get_currency("es"))
+
+    def test_percent_rounds_half_up(self):
+        self.assertEqual(Money(1050).percent(10), Money(105))
+        self.assertEqual(Money(5).percent(10), Money(1))
+        self.assertEqual(Money(4).percent(10), Money(0))
+
+    def test_format(self):
+        self.assertEqual(Money(123456789).format(), "1 234 567,89 ₽")
+        self.assertEqual(Money(123456, "USD").format(), "$1,234.56")
+        self.assertEqual(Money(-5, "EUR").format(), "-€0.05")
+        with self.assertRaises(ValueError):
+            Money(1) + Money(1, "USD")
+
+
+class ShippingTests(TestCase):
+    def test_tiers_and_surcharge(self):
+        self.assertEqual(get_shipping_cost(Decimal("0")), Money(50000))
+        self.assertEqual(get_shipping_cost(Decimal("1000")), Money(50000))
+        self.assertEqual(get_shipping_cost(Decimal("1000.01")), Money(80000))
+        self.assertEqual(get_shipping_cost(Decimal("10000")), Money(120000))
+        # 2,5 кг сверх 10 кг по 100 ₽ за кг
+        self.assertEqual(get_shipping_cost(Decimal("12500")), Money(145000))
+
+    @override_settings(
+        SHIPPING_RATES={
+            "default": {"tiers": [(1000, "500.00")], "per_kg": "50.00"},
+            "far": {"tiers": [(2000, "900.00"), (500, "700.00")], "per_kg": "0"},
+        }
+    )
+    def test_zones(self):
+        self.assertEqual(get_shipping_cost(Decimal("1500")), Money(52500))
+        self.assertEqual(get_shipping_cost(Decimal("400"), "far"), Money(70000))
+        self.assertEqual(get_shipping_cost(Decimal("5000"), "far"), Money(90000))
+        self.assertEqual(get_shipping_cost(Decimal("400"), "moon"), Money(50000))
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class ListingQueryBudgetTests(TestCase):
+    # Товары, категории и их переводы (включая резервный язык) загружаются
+    # фиксированным числом запросов, независимо от количества товаров
+    QUERY_BUDGET = 12
+    PRODUCT_COUNT = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = []
+        for i in range(3):
+            category = Category()
+            category.set_current_language("en")
+            category.name = f"Category {i}"
+            category.slug = f"category-{i}"
+            category.set_current_language("ru")
+            category.name = f"Категория {i}"
+            category.slug = f"kategoriya-{i}"
+            category.save()
+            categories.append(category)
+
+        for i in range(cls.PRODUCT_COUNT):
+            product = Product(
+                category=categories[i % len(categories)],
+                price=Decimal("1000.00"),
+                weight=Decimal("500.00"),
+            )
+            product.set_current_language("en")
+            product.name = f"Python {i}"
+            product.slug = f"python-{i}"
+            product.description = "Royal python"
+            # У части товаров нет русского перевода - используется резервный язык
+            if i % 2:
+                product.set_current_language("ru")
+                product.name = f"Питон {i}"
+                product.slug = f"piton-{i}"
+                product.description = "Королевский питон"
+            product.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def assertWithinBudget(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries),
+            self.QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries),
+        )
+        return response
+
+    def test_product_list(self):
+        with translation.override("ru"):
+            url = reverse("shop:product_list")
+        response = self.assertWithinBudget(url)
+        self.assertContains(response, "Питон 199<")
+        self.assertContains(response, "Python 198<")
+
+    def test_product_list_by_category(self):
+        with translation.override("ru"):
+            url = reverse("shop:product_list_by_category", args=["kategoriya-0"])
+        self.assertWithinBudget(url)
+
+    def test_product_list_pages(self):
+        with translation.override("ru"):
+            url = reverse("shop:product_list")
+        seen = []
+        page_url = url
+        while True:
+            response = self.assertWithinBudget(page_url)
+            page = response.context["page"]
+            self.assertLessEqual(len(page), settings.PRODUCTS_PER_PAGE)
+            seen.extend(card.product_id for card in page)
+            if not page.has_next:
+                break
+            page_url = f"{url}?after={page.next_cursor}"
+        self.assertEqual(len(seen), self.PRODUCT_COUNT)
+        self.assertEqual(len(set(seen)), self.PRODUCT_COUNT)
+
+        response = self.client.get(f"{url}?before={page.previous_cursor}")
+        previous_page = response.context["page"]
+        self.assertEqual(
+            [card.product_id for card in previous_page],
+            seen[-len(page) - settings.PRODUCTS_PER_PAGE : -len(page)],
+        )
+
+    def test_product_search(self):
+        with translation.override("ru"):
+            url = reverse("shop:product_search")
+        response = self.assertWithinBudget(f"{url}?q=python")
+        self.assertContains(response, "Python 2<")
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Питоны", slug="pitony")
+        cls.python = Product(category=category, price=Decimal("1000.00"))
+        cls.python.set_current_language("ru")
+        cls.python.name = "Королевский питон"
+        cls.python.slug = "korolevskij-piton"
+        cls.python.description = "Спокойная змея для начинающих"
+        cls.python.save()
+        cls.boa = Product(category=category, price=Decimal("2000.00"))
+        cls.boa.set_current_language("ru")
+        cls.boa.name = "Императорский удав"
+        cls.boa.slug = "imperatorskij-udav"
+        cls.boa.description = "Родственник питона"
+        cls.boa.save()
+
+    def search(self, query):
+        with translation.override("ru"):
+            url = reverse("shop:product_search")
+        response = self.client.get(url, {"q": query})
+        return [card.product_id for card in response.context["products"]]
+
+    def test_matches_word_forms_case_insensitively(self):
+        self.assertEqual(self.search("ПИТОНЫ"), [self.python.id, self.boa.id])
+        self.assertEqual(self.search("змеи"), [self.python.id])
+
+    def test_index_follows_translation_changes(self):
+        self.boa.set_current_language("ru")
+        self.boa.description = "Крупная змея"
+        self.boa.save()
+        self.assertEqual(self.search("питон"), [self.python.id])
+        self.python.delete()
+        self.assertEqual(self.search("питон"), [])
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Удавы", slug="udavy")
+        cls.product = Product.objects.create(
+            category=cls.category, name="Удав", slug="udav", price=Decimal("1500.00")
+        )
+
+    def setUp(self):
+        cache.clear()
+        with translation.override("ru"):
+            self.url = reverse("shop:product_list_by_category", args=["udavy"])
+
+    def test_repeated_hit_skips_catalog_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, "1 500,00")
+        catalog_queries = [q for q in queries if "shop_" in q["sql"]]
+        self.assertEqual(catalog_queries, [])
+
+    def test_invalid_cursor_shares_first_page_entry(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"{self.url}?after=garbage&before=junk")
+        catalog_queries = [q for q in queries if "shop_" in q["sql"]]
+        self.assertEqual(catalog_queries, [])
+
+    def test_admin_edit_invalidates_cached_page(self):
+        self.client.get(self.url)
+        self.product.price = Decimal("1750.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            # до фиксации транзакции версия не меняется
+            self.assertContains(self.client.get(self.url), "1 500,00")
+        response = self.client.get(self.url)
+        self.assertContains(response, "1 750,00")
+        self.assertNotContains(response, "1 500,00")
+
+
+# Redis на порту, где его нет: любое обращение к кэшу дает ошибку соединения
+UNREACHABLE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:1/0",
+    }
+}
+
+
+@override_settings(
+    CART_STORAGE="cart.storage.SessionCartStorage",
+    RECOMMENDER_BACKEND=IN_PROCESS_BACKEND,
+)
+class UnreachableCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Удавы", slug="udavy")
+        cls.product = Product.objects.create(
+            category=cls.category, name="Удав", slug="udav", price=Decimal("1500.00")
+        )
+
+    def setUp(self):
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+        # кэш "отключается" после создания товаров
+        settings_override = override_settings(CACHES=UNREACHABLE_CACHES)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(catalog_cache.breaker.record_success)
+
+    def test_catalog_is_served_uncached(self):
+        list_url = reverse("shop:product_list_by_category", args=["udavy"])
+        with self.assertLogs("shop.cache", "WARNING"):
+            response = self.client.get(list_url)
+        self.assertContains(response, "1 500,00")
+        self.assertTrue(catalog_cache.breaker.is_open)
+
+        # предохранитель открыт: страницы отдаются без попыток обратиться к кэшу
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, "Удав")
+        self.assertContains(self.client.get(list_url), "1 500,00")
+
+    def test_failed_bump_is_logged(self):
+        with self.assertLogs("shop.cache", "ERROR") as logs:
+            catalog_cache.bump_version(catalog_cache.ALL_PRODUCTS)
+        self.assertIn("products:all", logs.output[-1])
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Полозы", slug="polozy")
+        cls.product = Product.objects.create(
+            category=cls.category, name="Полоз", slug="poloz", price=Decimal("900.00")
+        )
+
+    def setUp(self):
+        cache.clear()
+        with translation.override("ru"):
+            self.list_url = reverse("shop:product_list")
+            self.detail_url = self.product.get_absolute_url()
+
+    def test_etag_answers_not_modified_until_catalog_changes(self):
+        for url in (self.list_url, self.detail_url):
+            self.client.get(url)
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.save()
+            response = self.client.get(url, headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_for_anonymous_visitors(self):
+        last_modified = self.client.get(self.list_url)["Last-Modified"]
+        self.client.cookies.clear()
+        response = self.client.get(
+            self.list_url, headers={"if-modified-since": last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class SlugRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Гадюки", slug="gadyuki")
+        cls.product = Product.objects.create(
+            category=cls.category, name="Гадюка", slug="gadyuka", price=Decimal("700.00")
+        )
+
+    def setUp(self):
+        cache.clear()
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+
+    def test_changed_category_slug_redirects(self):
+        old_url = self.category.get_absolute_url()
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+        self.category.set_current_language("ru")
+        self.category.slug = "vipery"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertRedirects(
+            self.client.get(old_url),
+            self.category.get_absolute_url(),
+            status_code=301,
+        )
+        # перенаправление хранится в базе и переживает очистку кэша
+        cache.clear()
+        slugs.category_ids.clear()
+        self.assertEqual(self.client.get(old_url).status_code, 301)
+        redirects = CategorySlugRedirect.objects.filter(category=self.category)
+        self.assertEqual(list(redirects.values_list("slug", flat=True)), ["gadyuki"])
+        unknown_url = reverse("shop:product_list_by_category", args=["unknown"])
+        self.assertEqual(self.client.get(unknown_url).status_code, 404)
+
+    def test_outdated_product_slug_redirects(self):
+        old_url = reverse("shop:product_detail", args=[self.product.id, "old-slug"])
+        self.assertRedirects(
+            self.client.get(old_url),
+            self.product.get_absolute_url(),
+            status_code=301,
+            fetch_redirect_response=False,
+        )
+
+
+@override_settings(RECOMMENDER_BACKEND=IN_PROCESS_BACKEND)
+class RecommenderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Удавы", slug="udavy")
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Удав {i}",
+                slug=f"udav-{i}",
+                price=Decimal("900.00"),
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+        self.recommender = Recommender()
+        ids = [p.id for p in self.products] + [-1]
+        self.recommender.backend.remove(ids)
+        self.addCleanup(self.recommender.backend.remove, ids)
+
+    def test_suggestions_are_ranked_by_combined_score(self):
+        first, second, third, fourth, fifth, sixth = self.products
+        self.recommender.products_bought([first, second, third])
+        self.recommender.products_bought([first, third])
+        self.recommender.products_bought([second, fourth, fifth])
+        self.recommender.products_bought([second, fourth])
+        self.recommender.products_bought([first, sixth])
+
+        # При равных баллах порядок как у ZREVRANGE: по убыванию идентификатора
+        suggested = self.recommender.suggest_products_for([first], 2)
+        self.assertEqual([card.product_id for card in suggested], [third.id, sixth.id])
+
+        suggested = self.recommender.suggest_products_for([first, second], 10)
+        self.assertEqual(
+            [card.product_id for card in suggested],
+            [third.id, fourth.id, sixth.id, fifth.id],
+        )
+        suggested = self.recommender.suggest_products_for([first, second], 1)
+        self.assertEqual([card.product_id for card in suggested], [third.id])
+
+    def test_detail_page_serves_cached_recommendations(self):
+        first, second, third = self.products[:3]
+        self.recommender.products_bought([first, second])
+        with mock.patch.object(
+            Connection, "send_packed_command", side_effect=AssertionError
+        ):
+            response = self.client.get(first.get_absolute_url())
+        self.assertEqual(
+            [card.product_id for card in response.context["recommended_products"]],
+            [second.id],
+        )
+
+        self.recommender.products_bought([first, third])
+        self.recommender.products_bought([first, third])
+        with mock.patch.object(
+            Connection, "send_packed_command", side_effect=AssertionError
+        ):
+            response = self.client.get(first.get_absolute_url())
+        self.assertEqual(
+            [card.product_id for card in response.context["recommended_products"]],
+            [third.id, second.id],
+        )
+
+    def test_rebuild_from_paid_orders(self):
+        first, second, third, fourth = self.products[:4]
+        # Устаревшие данные, которых нет в истории заказов
+        self.recommender.products_bought([first, fourth])
+
+        for paid, products in [
+            (True, [first, second, third]),
+            (True, [first, second]),
+            (True, [third]),
+            (False, [first, third]),
+        ]:
+            order = Order.objects.create(
+                first_name="Иван",
+                last_name="Иванов",
+                email="ivan@example.com",
+                address="Ленина, 1",
+                postal_code="101000",
+                city="Москва",
+                paid=paid,
+            )
+            for product in products:
+                OrderItem.objects.create(
+                    order=order, product=product, price=product.price
+                )
+
+        call_command("rebuild_copurchases", stdout=StringIO())
+
+        backend = self.recommender.backend
+        self.assertEqual(backend.scores(first.id), [(second.id, 2), (third.id, 1)])
+        self.assertEqual(backend.scores(fourth.id), [])
+        versions = catalog_cache.get_versions(
+            catalog_cache.recommendations_scope(first.id), catalog_cache.ALL_PRODUCTS
+        )
+        suggested = self.recommender.cached_suggestions_for(first, 4, versions)
+        self.assertEqual([card.product_id for card in suggested], [second.id, third.id])
+
+    def test_replace_all_drops_products_without_partners(self):
+        first, second = self.products[:2]
+        backend = self.recommender.backend
+        self.recommender.products_bought([first, second])
+        backend.replace_all({first.id: {}, second.id: {first.id: 1}}, 10, 100)
+        self.assertEqual(backend.scores(first.id), [])
+        self.assertEqual(backend.scores(second.id), [(first.id, 1)])
+
+    def test_copurchase_sets_are_capped(self):
+        first, second, third, fourth = self.products[:4]
+        backend = self.recommender.backend
+        with override_settings(RECOMMENDER_MAX_PARTNERS=2):
+            self.recommender.products_bought([first, second])
+            self.recommender.products_bought([first, second, third, fourth])
+        self.assertEqual(backend.scores(first.id), [(second.id, 2), (fourth.id, 1)])
+
+        self.recommender.products_bought(self.products)
+        self.assertEqual(len(backend.scores(first.id)), 5)
+        with override_settings(RECOMMENDER_MAX_PARTNERS=3):
+            self.recommender.compact()
+        self.assertEqual(len(backend.scores(first.id)), 3)
+
+        usage = self.recommender.memory_usage()
+        keys, size = usage["product:*:purchased_with"]
+        self.assertGreaterEqual(keys, len(self.products))
+        self.assertGreater(size, 0)
+
+    def test_clear_purchases_removes_keys_of_deleted_products(self):
+        first, second = self.products[:2]
+        self.recommender.products_bought([first, second])
+        # данные товара, которого уже нет в базе
+        self.recommender.backend.add_purchases([-1, first.id], 10, 10)
+
+        progress = []
+        deleted = self.recommender.clear_puchases(batch_size=1, progress=progress.append)
+        self.assertGreaterEqual(deleted, 3)
+        self.assertEqual(progress[-1], deleted)
+        for product_id in (-1, first.id, second.id):
+            self.assertEqual(self.recommender.backend.scores(product_id), [])
+        self.assertEqual(self.recommender.memory_usage(), {})
+
+
+class UnstableBackend(InProcessBackend):
+    """Хранилище, которое можно "отключить" """
+
+    errors = (ConnectionError,)
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.calls = 0
+
+    def check(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("Хранилище недоступно")
+
+    def add_purchases(self, *args, **kwargs):
+        self.check()
+        return super().add_purchases(*args, **kwargs)
+
+    def suggest(self, *args, **kwargs):
+        self.check()
+        return super().suggest(*args, **kwargs)
+
+
+class RecommenderDegradedModeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Полозы", slug="polozy")
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Полоз {i}",
+                slug=f"poloz-{i}",
+                price=Decimal("800.00"),
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        translation.activate("ru")
+        self.addCleanup(translation.deactivate)
+        self.backend = UnstableBackend()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self.recommender = Recommender(self.backend, self.breaker, deque(maxlen=2))
+
+    def versions(self, product):
+        return catalog_cache.get_versions(
+            catalog_cache.recommendations_scope(product.id), catalog_cache.ALL_PRODUCTS
+        )
+
+    def test_open_circuit_skips_backend(self):
+        first, second = self.products[:2]
+        self.backend.down = True
+        with self.assertLogs("shop.recommender", "WARNING"):
+            self.assertEqual(self.recommender.suggest_products_for([first, second]), [])
+            self.assertEqual(self.recommender.suggest_products_for([first, second]), [])
+        self.assertTrue(self.breaker.is_open)
+
+        calls = self.backend.calls
+        self.assertEqual(self.recommender.suggest_products_for([first, second]), [])
+        self.assertEqual(self.backend.calls, calls)
+
+        # после паузы пробный запрос восстанавливает работу
+        self.backend.down = False
+        self.breaker.opened_at -= 30
+        self.recommender.suggest_products_for([first, second])
+        self.assertFalse(self.breaker.is_open)
+
+    def test_last_known_recommendations_are_served(self):
+        first, second = self.products[:2]
+        self.recommender.products_bought([first, second])
+        self.backend.down = True
+        # версия рекомендаций изменилась, а хранилище недоступно
+        catalog_cache.bump_version(catalog_cache.recommendations_scope(first.id))
+        with self.assertLogs("shop.recommender", "WARNING"):
+            suggested = self.recommender.cached_suggestions_for(
+                first, 4, self.versions(first)
+            )
+        self.assertEqual([card.product_id for card in suggested], [second.id])
+
+    def test_purchases_are_buffered_and_replayed(self):
+        first, second, third = self.products
+        self.backend.down = True
+        with self.assertLogs("shop.recommender", "WARNING") as logs:
+            self.recommender.products_bought([first, second])
+            self.recommender.products_bought([first, third])
+            self.recommender.products_bought([second, third])
+        self.assertIn("Буфер рекомендаций переполнен", logs.output[-1])
+        # в буфере остаются два последних заказа
+        self.assertEqual(
+            list(self.recommender.pending),
+            [[first.id, third.id], [second.id, third.id]],
+        )
+
+        self.backend.down = False
+        self.breaker.record_success()
+        self.recommender.products_bought([first, third])
+        self.assertFalse(self.recommender.pending)
+        self.assertEqual(self.backend.scores(first.id), [(third.id, 2)])
+        self.assertEqual(self.backend.scores(third.id), [(first.id, 2), (second.id, 1)])
+
+    def test_backend_and_cache_down(self):
+        first, second = self.products[:2]
+        settings_override = override_settings(CACHES=UNREACHABLE_CACHES)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(catalog_cache.breaker.record_success)
+
+        # без кэша заказ учитывается, а рекомендации берутся из хранилища
+        with self.assertLogs("shop.cache", "WARNING"):
+            self.recommender.products_bought([first, second])
+        self.assertEqual(self.backend.scores(first.id), [(second.id, 1)])
+        suggested = self.recommender.cached_suggestions_for(
+            first, 4, self.versions(first)
+        )
+        self.assertEqual([card.product_id for card in suggested], [second.id])
+
+        self.backend.down = True
+        with self.assertLogs("shop.recommender", "WARNING"):
+            self.assertEqual(
+                self.recommender.cached_suggestions_for(first, 4, self.versions(first)),
+                [],
+            )
+            self.recommender.products_bought([first, second])
+        self.assertEqual(list(self.recommender.pending), [[first.id, second.id]])
+
+
+@skipUnless(redis_available(), "Redis недоступен")
+@override_settings(
+    RECOMMENDER_BACKEND="shop.recommender_backends.RedisBackend",
+    REDIS_DB=REDIS_TEST_DB,
+)
+class RedisRecommenderTests(RecommenderTests):
+    def test_rebuild_replaces_staging_keys(self):
+        first, second = self.products[:2]
+        backend = self.recommender.backend
+        backend.client.zadd(backend._staging_key(first.id), {-1: 5})
+        backend.replace_all({first.id: {second.id: 1}}, 10, chunk_size=10)
+        self.assertEqual(backend.scores(first.id), [(second.id, 1)])
+        self.assertFalse(backend.client.exists(backend._staging_key(first.id)))
+
+    def test_memory_usage_groups_cart_keys(self):
+        backend = self.recommender.backend
+        for _ in range(2):
+            cart_key = f"cart:{uuid.uuid4().hex}"
+            backend.client.hset(cart_key, "coupon", 1)
+            self.addCleanup(backend.client.delete, cart_key)
+        self.assertEqual(self.recommender.memory_usage()["cart:*"][0], 2)
+        self.assertEqual(key_prefix(f"order:{uuid.uuid4()}:items"), "order:*:items")
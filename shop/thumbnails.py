@@ -0,0 +1,91 @@
+"""
+Уменьшенные копии изображений товаров.
+
+Для каждого оригинала создаются JPEG и WebP копии фиксированной ширины
+(settings.THUMBNAIL_SIZES) рядом с ним в том же хранилище:
+products/2025/01/01/boa.jpg -> products/2025/01/01/boa_400.jpg, boa_400.webp
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+FORMATS = {
+    "jpeg": ("jpg", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 6}),
+}
+
+
+def derivative_name(name, width, format="jpeg"):
+    root, _ = os.path.splitext(name)
+    extension, _ = FORMATS[format]
+    return f"{root}_{width}.{extension}"
+
+
+def get_widths():
+    return sorted(settings.THUMBNAIL_SIZES.values())
+
+
+def _encode(image, format):
+    _, options = FORMATS[format]
+    if format == "jpeg" and image.mode != "RGB":
+        # JPEG не поддерживает прозрачность - кладем на белый фон
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        if image.mode in ("RGBA", "LA"):
+            background.paste(image, mask=image.getchannel("A"))
+        else:
+            background.paste(image.convert("RGB"))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, format=format.upper(), **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage):
+    """Создает все копии изображения, возвращает их имена"""
+    with storage.open(name, "rb") as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    names = []
+    for width in get_widths():
+        resized = image.copy()
+        # Не увеличиваем изображения меньше нужной ширины
+        resized.thumbnail((width, width * 10), Image.LANCZOS)
+        for format in FORMATS:
+            derivative = derivative_name(name, width, format)
+            if storage.exists(derivative):
+                storage.delete(derivative)
+            storage.save(derivative, ContentFile(_encode(resized, format)))
+            names.append(derivative)
+    return names
+
+
+def has_derivatives(name, format="jpeg", storage=default_storage):
+    return storage.exists(derivative_name(name, get_widths()[-1], format))
+
+
+def thumbnail_url(image, size, format="jpeg"):
+    """URL копии размера size (ключ THUMBNAIL_SIZES) или оригинала"""
+    if not image:
+        return ""
+    derivative = derivative_name(image.name, settings.THUMBNAIL_SIZES[size], format)
+    if image.storage.exists(derivative):
+        return image.storage.url(derivative)
+    return image.url
+
+
+def srcset(image, format="jpeg"):
+    """Значение атрибута srcset; пустая строка, пока копии не созданы"""
+    if not image or not has_derivatives(image.name, format, image.storage):
+        return ""
+    return ", ".join(
+        f"{image.storage.url(derivative_name(image.name, width, format))} {width}w"
+        for width in get_widths()
+    )
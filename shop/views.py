@@ -1,85 +1,222 @@
 from cart.forms import CartAddProductForm
+from django.conf import settings
 from django.db.models import Q
-from django.shortcuts import get_object_or_404, render
+from django.http import Http404
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
-from .models import Category, Product
+from . import cache as catalog_cache
+from . import conditional, search, slugs
+from .models import Category, Product, ProductCard
+from .pagination import decode_cursors, paginate
 from .recommender import Recommender
 
 
-def product_list(request, category_slug=None):
+def catalog_page(request, category_slug=None):
+    """
+    Данные страницы каталога. Вычисляются один раз за запрос: их используют
+    и валидаторы условного GET, и само представление.
+    """
+    if getattr(request, "_catalog_page", None) is not None:
+        return request._catalog_page
+
+    language = request.LANGUAGE_CODE
     category = None
-    categories = Category.objects.all()
-    products = Product.objects.filter(available=True)
+    categories = Category.objects.prefetch_related("translations")
+    products = ProductCard.objects.filter(language_code=language, available=True)
+    (categories_version,) = catalog_cache.get_versions(catalog_cache.CATEGORIES)
+    scope = catalog_cache.ALL_PRODUCTS
 
     if category_slug:
-        language = request.LANGUAGE_CODE
-        category = get_object_or_404(
-            Category,
-            translations__language_code=language,
-            translations__slug=category_slug,
+        category_id = slugs.resolve_category_id(
+            language, category_slug, categories_version
+        )
+        moved = category_id is None
+        if moved:
+            category_id = slugs.resolve_category_redirect(
+                language, category_slug, categories_version
+            )
+            if category_id is None:
+                raise Http404("No Category matches the given query.")
+        category = catalog_cache.get_or_set(
+            ("category", language, category_id, categories_version),
+            lambda: get_object_or_404(categories, pk=category_id),
         )
-        products = products.filter(category=category)
+        if moved:
+            # slug категории изменился - перенаправляем на новый адрес
+            request._catalog_page = {"redirect": category.get_absolute_url()}
+            return request._catalog_page
+        products = products.filter(category_id=category.id)
+        scope = catalog_cache.category_scope(category.id)
+
+    # ключ кэша зависит от курсора, а не от строки запроса: поврежденные
+    # курсоры не плодят записи
+    after, before = decode_cursors(request.GET.get("after"), request.GET.get("before"))
+    catalog_version = catalog_cache.get_version(scope)
+    page = catalog_cache.get_or_set(
+        ("page", language, category_slug, after, before, catalog_version),
+        lambda: paginate(
+            products,
+            settings.PRODUCTS_PER_PAGE,
+            after=after,
+            before=before,
+            fields=("created", "product_id"),
+        ),
+    )
+    last_modified = max(
+        [catalog_cache.version_timestamp(categories_version, catalog_version)]
+        + [card.updated for card in page]
+    )
 
-    return render(
+    request._catalog_page = {
+        "category": category,
+        "categories": categories,
+        "products": page.object_list,
+        "page": page,
+        "categories_version": categories_version,
+        "catalog_version": catalog_version,
+        "cache_timeout": settings.CATALOG_CACHE_TIMEOUT,
+        "last_modified": last_modified,
+    }
+    return request._catalog_page
+
+
+def catalog_etag(request, category_slug=None):
+    context = catalog_page(request, category_slug)
+    if "redirect" in context:
+        return None
+    return conditional.make_etag(
         request,
-        "shop/product/list.html",
-        {
-            "category": category,
-            "categories": categories,
-            "products": products,
-        },
+        category_slug,
+        request.GET.get("after"),
+        request.GET.get("before"),
+        context["categories_version"],
+        context["catalog_version"],
+        context["last_modified"],
     )
 
 
-def product_detail(request, id, slug):
+def catalog_last_modified(request, category_slug=None):
+    if conditional.is_personalized(request):
+        return None
+    return catalog_page(request, category_slug).get("last_modified")
+
+
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def product_list(request, category_slug=None):
+    context = catalog_page(request, category_slug)
+    if "redirect" in context:
+        return redirect(context["redirect"], permanent=True)
+    return render(request, "shop/product/list.html", context)
+
+
+def product_page(request, id, slug):
+    """Данные страницы товара, вычисляются один раз за запрос"""
+    if getattr(request, "_product_page", None) is not None:
+        return request._product_page
+
     language = request.LANGUAGE_CODE
+    # Товар ищется по первичному ключу, без соединения с таблицей переводов
     product = get_object_or_404(
-        Product,
-        id=id,
-        translations__language_code=language,
-        translations__slug=slug,
-        available=True,
+        Product.objects.prefetch_related("translations"), id=id, available=True
     )
+    product_slugs = {t.language_code: t.slug for t in product.translations.all()}
+    if language not in product_slugs:
+        raise Http404("No Product matches the given query.")
+    if product_slugs[language] != slug:
+        # slug товара изменился - перенаправляем на новый адрес
+        request._product_page = {"redirect": product.get_absolute_url()}
+        return request._product_page
 
     # Получаем все дополнительные изображения товара
-    additional_images = product.images.all()
+    additional_images = list(product.images.all())
 
-    cart_product_form = CartAddProductForm()
+    catalog_versions = catalog_cache.get_versions(
+        catalog_cache.ALL_PRODUCTS,
+        catalog_cache.category_scope(product.category_id),
+        catalog_cache.recommendations_scope(product.id),
+    )
+    all_version, category_version, recommendations_version = catalog_versions
+    # Рекомендации берутся из кэша, Redis нужен только при промахе
     r = Recommender()
-    recommended_products = r.suggest_products_for([product], 4)
+    recommended_products = r.cached_suggestions_for(
+        product, 4, (recommendations_version, all_version)
+    )
+
+    request._product_page = {
+        "product": product,
+        "additional_images": additional_images,
+        "cart_product_form": CartAddProductForm(),
+        "recommended_products": recommended_products,
+        "catalog_versions": catalog_versions,
+        "last_modified": max(
+            product.updated, catalog_cache.version_timestamp(*catalog_versions)
+        ),
+    }
+    return request._product_page
+
 
-    return render(
+def product_etag(request, id, slug):
+    context = product_page(request, id, slug)
+    if "redirect" in context:
+        return None
+    return conditional.make_etag(
         request,
-        "shop/product/detail.html",
-        {
-            "product": product,
-            "additional_images": additional_images,
-            "cart_product_form": cart_product_form,
-            "recommended_products": recommended_products,
-        },
+        id,
+        slug,
+        context["catalog_versions"],
+        context["last_modified"],
+        [p.product_id for p in context["recommended_products"]],
     )
 
 
+def product_last_modified(request, id, slug):
+    if conditional.is_personalized(request):
+        return None
+    return product_page(request, id, slug).get("last_modified")
+
+
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+def product_detail(request, id, slug):
+    context = product_page(request, id, slug)
+    if "redirect" in context:
+        return redirect(context["redirect"], permanent=True)
+    return render(request, "shop/product/detail.html", context)
+
+
 def product_search(request):
     query = request.GET.get('q', '').strip()
-    products = Product.objects.filter(available=True)
+    products = ProductCard.objects.filter(
+        language_code=request.LANGUAGE_CODE, available=True
+    )
     
     if query:
-        # Ищем в нескольких вариантах
-        query_variants = [
-            query,           # оригинальный запрос
-            query.lower(),   # нижний регистр
-            query.upper(),   # верхний регистр
-            query.capitalize(), # с заглавной буквы
-        ]
-        
-        # Создаем Q объекты для всех вариантов
-        q_objects = Q()
-        for variant in set(query_variants):  # set для удаления дубликатов
-            q_objects |= Q(translations__name__icontains=variant)
-            q_objects |= Q(translations__description__icontains=variant)
-        
-        products = products.filter(q_objects).distinct()
+        product_ids = search.search_product_ids(query, request.LANGUAGE_CODE)
+        if product_ids is not None:
+            # Полнотекстовый индекс: сохраняем порядок по релевантности
+            position = {product_id: i for i, product_id in enumerate(product_ids)}
+            products = sorted(
+                products.filter(product_id__in=product_ids),
+                key=lambda card: position[card.product_id],
+            )
+        else:
+            # Ищем в нескольких вариантах
+            query_variants = [
+                query,           # оригинальный запрос
+                query.lower(),   # нижний регистр
+                query.upper(),   # верхний регистр
+                query.capitalize(), # с заглавной буквы
+            ]
+            
+            # Создаем Q объекты для всех вариантов
+            q_objects = Q()
+            for variant in set(query_variants):  # set для удаления дубликатов
+                q_objects |= Q(translations__name__icontains=variant)
+                q_objects |= Q(translations__description__icontains=variant)
+            
+            products = products.filter(
+                product__in=Product.objects.filter(q_objects).values("id")
+            )
     
     return render(request, 'shop/product/search.html', {
         'products': products,